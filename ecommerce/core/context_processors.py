@@ -1,10 +1,17 @@
-from ecommerce.core.url_utils import get_lms_dashboard_url, get_lms_url
+def core(request):
+    # Context processors run for every RequestContext created while handling a request. Compute the values once,
+    # and reuse them for any subsequent templates rendered for the same request.
+    context = getattr(request, '_core_context', None)
 
+    if context is None:
+        site = request.site
+        site_configuration = site.siteconfiguration
+        context = {
+            'lms_base_url': site_configuration.build_lms_url(),
+            'lms_dashboard_url': site_configuration.student_dashboard_url,
+            'platform_name': site.name,
+            'support_url': site_configuration.payment_support_url,
+        }
+        request._core_context = context  # pylint: disable=protected-access
 
-def core(request):
-    return {
-        'lms_base_url': get_lms_url(),
-        'lms_dashboard_url': get_lms_dashboard_url(),
-        'platform_name': request.site.name,
-        'support_url': request.site.siteconfiguration.payment_support_url,
-    }
+    return context
@@ -280,6 +280,11 @@ class SiteConfiguration(models.Model):
         Returns:
             str
         """
+        if not path:
+            # urljoin() returns the root unchanged when there is no path to join. Skip the URL parsing, since
+            # this is called (e.g. by the core context processor) for nearly every rendered page.
+            return self.lms_url_root
+
         return urljoin(self.lms_url_root, path)
 
     def build_enterprise_service_url(self, path=''):
@@ -474,6 +479,31 @@ class User(AbstractUser):
             )
             raise
 
+    def is_account_active(self, request):
+        """ Check if the user's LMS account has been activated.
+
+        The status is only stored in cache when the account is active, so that users who have just activated their
+        account are not held up by a cached inactive status.
+
+        Args:
+            request (WSGIRequest): The request from which the LMS account API endpoint is created.
+
+        Returns:
+            True if the account is active, False otherwise.
+
+        Raises:
+            ConnectionError, SlumberBaseException and Timeout for failures in establishing a
+            connection with the LMS account API endpoint.
+        """
+        cache_key = 'account_active_{username}'.format(username=self.username)
+        cache_key = hashlib.md5(cache_key).hexdigest()
+        is_active = cache.get(cache_key)
+        if not is_active:
+            is_active = bool(self.account_details(request).get('is_active'))
+            if is_active:
+                cache.set(cache_key, is_active, settings.ACCOUNT_ACTIVATION_STATUS_CACHE_TIMEOUT)
+        return is_active
+
     def is_eligible_for_credit(self, course_key):
         """
         Check if a user is eligible for a credit course.
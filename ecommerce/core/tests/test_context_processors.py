@@ -1,19 +1,20 @@
-from threadlocals.threadlocals import get_current_request
-
 from ecommerce.core.context_processors import core
-from ecommerce.core.url_utils import get_lms_dashboard_url, get_lms_url
 from ecommerce.tests.testcases import TestCase
 
 
 class CoreContextProcessorTests(TestCase):
     def test_core(self):
-        request = get_current_request()
-        self.assertDictEqual(
-            core(request),
-            {
-                'lms_base_url': get_lms_url(),
-                'lms_dashboard_url': get_lms_dashboard_url(),
-                'platform_name': request.site.name,
-                'support_url': request.site.siteconfiguration.payment_support_url,
-            }
-        )
+        site_configuration = self.site.siteconfiguration
+        site_configuration.payment_support_url = 'https://support.example.com'
+        expected = {
+            'lms_base_url': 'http://lms.testserver.fake',
+            'lms_dashboard_url': 'http://lms.testserver.fake/dashboard',
+            'platform_name': self.site.name,
+            'support_url': 'https://support.example.com',
+        }
+        self.assertEqual(core(self.request), expected)
+
+    def test_core_memoized_per_request(self):
+        """ Verify the context is computed once per request, and reused by subsequent calls. """
+        context = core(self.request)
+        self.assertIs(core(self.request), context)
@@ -115,6 +115,28 @@ class UserTests(CourseCatalogTestMixin, LmsApiMockMixin, TestCase):
         expected = {'Authorization': 'JWT {}'.format(token), }
         self.assertDictContainsSubset(expected, last_request.headers)
 
+    @httpretty.activate
+    def test_account_active_status_cache(self):
+        """ Verify the account activation status is cached when the account is active. """
+        user = self.create_user()
+        self.mock_account_api(self.request, user.username, data={'is_active': True})
+        self.mock_access_token_response()
+        self.assertTrue(user.is_account_active(self.request))
+
+        httpretty.disable()
+        self.assertTrue(user.is_account_active(self.request))
+
+    @httpretty.activate
+    def test_account_active_status_not_cached(self):
+        """ Verify the account activation status is not cached when the account is inactive. """
+        user = self.create_user()
+        self.mock_account_api(self.request, user.username, data={'is_active': False})
+        self.mock_access_token_response()
+        self.assertFalse(user.is_account_active(self.request))
+
+        self.mock_account_api(self.request, user.username, data={'is_active': True})
+        self.assertTrue(user.is_account_active(self.request))
+
     def test_no_user_details(self):
         """ Verify False is returned when there is a connection error. """
         user = self.create_user()
@@ -311,6 +333,13 @@ class SiteConfigurationTests(TestCase):
         site_config = SiteConfigurationFactory(from_email=expected_from_email)
         self.assertEqual(site_config.get_from_email(), expected_from_email)
 
+    def test_build_lms_url(self):
+        """ Verify the method returns the LMS URL root when no path is given, and joins the path otherwise. """
+        site_config = SiteConfigurationFactory(lms_url_root='http://lms.testserver.fake')
+        self.assertEqual(site_config.build_lms_url(), 'http://lms.testserver.fake')
+        self.assertEqual(site_config.build_lms_url('/dashboard'), 'http://lms.testserver.fake/dashboard')
+        self.assertEqual(site_config.student_dashboard_url, 'http://lms.testserver.fake/dashboard')
+
     @httpretty.activate
     def test_access_token(self):
         """ Verify the property retrieves, and caches, an access token from the OAuth 2.0 provider. """
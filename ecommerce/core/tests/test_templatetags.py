@@ -4,6 +4,16 @@ from django.template import Context, Template, TemplateSyntaxError
 
 from ecommerce.tests.testcases import TestCase
 
+CAPTUREAS_TEMPLATE = Template(
+    "{% load core_extras %}"
+    "{% captureas foo %}{{ expected }}{%endcaptureas%}"
+    "{{ foo }}"
+)
+COURSE_ORGANIZATION_TEMPLATE = Template(
+    "{% load core_extras %}"
+    "{{ course_id|course_organization }}"
+)
+
 
 class CoreExtrasTests(TestCase):
     def test_settings_value(self):
@@ -20,13 +30,8 @@ class CoreExtrasTests(TestCase):
             self.assertEqual(template.render(Context()), "edX")
 
     def assertTextCaptured(self, expected):
-        template = Template(
-            "{% load core_extras %}"
-            "{% captureas foo %}{{ expected }}{%endcaptureas%}"
-            "{{ foo }}"
-        )
         # Tag should render the value captured in the block.
-        self.assertEqual(template.render(Context({'expected': expected})), expected)
+        self.assertEqual(CAPTUREAS_TEMPLATE.render(Context({'expected': expected})), expected)
 
     def test_captureas(self):
         # Tag requires a variable name.
@@ -40,8 +45,4 @@ class CoreExtrasTests(TestCase):
 
     def test_course_organization(self):
         course_id = 'course-v1:edX+Course+100'
-        template = Template(
-            "{% load core_extras %}"
-            "{{ course_id|course_organization }}"
-        )
-        self.assertEqual(template.render(Context({'course_id': course_id})), 'edX')
+        self.assertEqual(COURSE_ORGANIZATION_TEMPLATE.render(Context({'course_id': course_id})), 'edX')
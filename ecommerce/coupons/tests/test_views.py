@@ -7,6 +7,7 @@ import mock
 import pytz
 from django.conf import settings
 from django.core.urlresolvers import reverse
+from django.test import SimpleTestCase
 from django.utils.timezone import now
 from factory.fuzzy import FuzzyText
 from oscar.core.loading import get_class, get_model
@@ -44,9 +45,10 @@ ENTERPRISE_CUSTOMER = 'cf246b88-d5f6-4908-a522-fc307e0b0c59'
 
 
 def format_url(base='', path='', params=None):
+    url = base + path
     if params:
-        return '{base}{path}?{params}'.format(base=base, path=path, params=urllib.urlencode(params))
-    return '{base}{path}'.format(base=base, path=path)
+        url = '{url}?{params}'.format(url=url, params=urllib.urlencode(params))
+    return url
 
 
 class CouponAppViewTests(TestCase):
@@ -72,6 +74,16 @@ class CouponAppViewTests(TestCase):
         self.assert_response_status(is_staff=True, status_code=200)
 
 
+class VoucherIsValidNoVoucherTests(SimpleTestCase):
+    """ Tests for voucher_is_valid() that do not require a database, site, or partner. """
+
+    def test_no_voucher(self):
+        """ Verify voucher_is_valid() assess that the voucher is invalid. """
+        valid, msg = voucher_is_valid(voucher=None, products=None, request=None)
+        self.assertFalse(valid)
+        self.assertEqual(msg, 'Coupon does not exist.')
+
+
 class VoucherIsValidTests(CourseCatalogTestMixin, TestCase):
     def test_valid_voucher(self):
         """ Verify voucher_is_valid() assess that the voucher is valid. """
@@ -81,12 +93,6 @@ class VoucherIsValidTests(CourseCatalogTestMixin, TestCase):
         self.assertTrue(valid)
         self.assertEquals(msg, '')
 
-    def test_no_voucher(self):
-        """ Verify voucher_is_valid() assess that the voucher is invalid. """
-        valid, msg = voucher_is_valid(voucher=None, products=None, request=None)
-        self.assertFalse(valid)
-        self.assertEqual(msg, 'Coupon does not exist.')
-
     def test_expired_voucher(self):
         """ Verify voucher_is_valid() assess that the voucher has expired. """
         start_datetime = now() - datetime.timedelta(days=20)
@@ -257,7 +263,7 @@ class CouponOfferViewTests(ApiMockMixin, CouponMixin, CourseCatalogTestMixin, En
     def test_consent_failed_no_enterprise_customer(self):
         """ Verify that an error is returned if the voucher has no associated EnterpriseCustomer. """
         base_url = self.prepare_url_for_credit_seat(enterprise_customer=None)
-        sku = self.credit_seat.stockrecords.first().partner_sku
+        sku = self.credit_seat.stockrecords.values_list('partner_sku', flat=True).first()
         url = '{}&consent_failed={}'.format(base_url, sku)
         response = self.client.get(url)
         self.assertEqual(
@@ -284,7 +290,7 @@ class CouponOfferViewTests(ApiMockMixin, CouponMixin, CourseCatalogTestMixin, En
             contact_email=contact_email
         )
         base_url = self.prepare_url_for_credit_seat(enterprise_customer=ENTERPRISE_CUSTOMER)
-        sku = self.credit_seat.stockrecords.first().partner_sku
+        sku = self.credit_seat.stockrecords.values_list('partner_sku', flat=True).first()
         url = '{}&consent_failed={}'.format(base_url, sku)
         response = self.client.get(url)
         self.assertContains(
@@ -313,7 +319,7 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
         )
         self.stock_record = StockRecord.objects.get(product=self.seat)
         self.catalog = Catalog.objects.create(partner=self.partner)
-        self.catalog.stock_records.add(StockRecord.objects.get(product=self.seat))
+        self.catalog.stock_records.add(self.stock_record)
 
     def redeem_url_with_params(self, code=COUPON_CODE, consent_token=None):
         """ Constructs the coupon redemption URL with the proper string query parameters. """
@@ -340,10 +346,15 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
             email_domains=email_domains,
             enterprise_customer=enterprise_customer
         )
-        coupon_code = coupon.attr.coupon_vouchers.vouchers.first().code
-        self.assertEqual(Voucher.objects.filter(code=coupon_code).count(), 1)
+        coupon_code = Voucher.objects.filter(coupon_vouchers__coupon=coupon).values_list('code', flat=True).first()
+        self.assertTrue(Voucher.objects.filter(code=coupon_code).exists())
         return coupon_code
 
+    def mock_user_account_api(self, is_active=True):
+        """ Mocks the access token and account API responses for the test user. """
+        self.mock_access_token_response()
+        self.mock_account_api(self.request, self.user.username, data={'is_active': is_active})
+
     def redeem_coupon(self, code=COUPON_CODE, consent_token=None):
         self.request.user = self.user
         self.mock_enrollment_api(self.request, self.user, self.course.id, is_active=False, mode=self.course_mode)
@@ -417,8 +428,7 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
     def test_basket_redirect_discount_code(self):
         """ Verify the view redirects to the basket single-item view when a discount code is provided. """
         self.mock_course_api_response(course=self.course)
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
+        self.mock_user_account_api()
 
         self.create_coupon(catalog=self.catalog, code=COUPON_CODE, benefit_value=5)
         expected_url = self.get_full_url(path=reverse('basket:summary'))
@@ -429,27 +439,27 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
         """ Verify the view redirects to the receipt page when an enrollment code is provided. """
         self.toggle_ecommerce_receipt_page(True)
         code = self.create_coupon_and_get_code(benefit_value=100, code='')
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
+        self.mock_user_account_api()
 
-        self.assert_redirects_to_receipt_page(code=code)
+        # Redeeming places a free order, so this pins the queries of the whole redeem-and-fulfill path.
+        with self.assertNumQueries(107):
+            self.assert_redirects_to_receipt_page(code=code)
 
     @httpretty.activate
+    @mock.patch('ecommerce.coupons.views.logger.exception')
     @mock.patch.object(EdxOrderPlacementMixin, 'place_free_order')
-    def test_basket_redirect_enrollment_code_error(self, place_free_order):
+    def test_basket_redirect_enrollment_code_error(self, place_free_order, mock_logger):
         """ Verify the view redirects to checkout error page when an order hasn't completed. """
         code = self.create_coupon_and_get_code(benefit_value=100, code='')
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
+        self.mock_user_account_api()
         place_free_order.return_value = Exception
 
-        with mock.patch('ecommerce.coupons.views.logger.exception') as mock_logger:
-            self.assert_redemption_page_redirects(
-                self.get_full_url(reverse('checkout:error')),
-                target=301,
-                code=code
-            )
-            self.assertTrue(mock_logger.called)
+        self.assert_redemption_page_redirects(
+            self.get_full_url(reverse('checkout:error')),
+            target=301,
+            code=code
+        )
+        self.assertTrue(mock_logger.called)
 
     def prepare_enterprise_data(self):
         """Creates an enterprise coupon and mocks enterprise endpoints."""
@@ -462,8 +472,7 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
         self.mock_enrollment_api(self.request, self.user, self.course.id, is_active=False, mode=self.course_mode)
         self.mock_enterprise_learner_api(consent_provided=False)
         self.mock_enterprise_course_enrollment_api(results_present=False)
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
+        self.mock_user_account_api()
         self.mock_specific_enterprise_customer_api(ENTERPRISE_CUSTOMER)
         return code
 
@@ -493,14 +502,6 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
     def test_enterprise_customer_invalid_consent_token(self):
         """ Verify that the view renders an error when the consent token doesn't match. """
         code = self.prepare_enterprise_data()
-        self.request.user = self.user
-        self.mock_enrollment_api(self.request, self.user, self.course.id, is_active=False, mode=self.course_mode)
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
-        self.mock_specific_enterprise_customer_api(ENTERPRISE_CUSTOMER)
-        self.mock_enterprise_learner_api(consent_provided=False)
-        self.mock_enterprise_course_enrollment_api(results_present=False)
-
         response = self.client.get(self.redeem_url_with_params(code=code, consent_token='invalid_consent_token'))
         self.assertEqual(response.context['error'], 'Invalid data sharing consent token provided.')
 
@@ -530,10 +531,11 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
             ENTERPRISE_CUSTOMER
         )
 
-        self.assert_redirects_to_receipt_page(
-            code=code,
-            consent_token=consent_token
-        )
+        with self.assertNumQueries(110):
+            self.assert_redirects_to_receipt_page(
+                code=code,
+                consent_token=consent_token
+            )
         last_request = httpretty.last_request()
         self.assertEqual(last_request.path, '/api/enrollment/v1/enrollment')
         self.assertEqual(last_request.method, 'POST')
@@ -546,8 +548,7 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
         basket = Basket.get_basket(self.user, self.site)
         basket.vouchers.add(Voucher.objects.get(code=code))
 
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
+        self.mock_user_account_api()
 
         self.assert_redirects_to_receipt_page(code=code)
 
@@ -555,8 +556,7 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
     def test_already_enrolled_rejection(self):
         """ Verify a user is rejected from redeeming a coupon for a course she's already enrolled in."""
         self.mock_enrollment_api(self.request, self.user, self.course.id, is_active=True, mode=self.course_mode)
-        self.mock_account_api(self.request, self.user.username, data={'is_active': True})
-        self.mock_access_token_response()
+        self.mock_user_account_api()
 
         self.create_coupon_and_get_code()
         response = self.client.get(self.redeem_url_with_params())
@@ -575,9 +575,8 @@ class CouponRedeemViewTests(CouponMixin, CourseCatalogTestMixin, LmsApiMockMixin
     @httpretty.activate
     def test_inactive_user_rejection(self):
         """ Verify that a user who hasn't activated the account is rejected. """
-        self.mock_account_api(self.request, self.user.username, data={'is_active': False})
         self.create_coupon_and_get_code()
-        self.mock_access_token_response()
+        self.mock_user_account_api(is_active=False)
 
         response = self.client.get(self.redeem_url_with_params())
         self.assertEqual(response.context['course_name'], self.course.name)
@@ -618,3 +617,11 @@ class EnrollmentCodeCsvViewTests(TestCase):
         response = self.client.get(reverse(self.path, args=[order.number]))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['content-type'], 'text/csv')
+
+        # The order line vouchers are read with one query, and the codes of each line with another.
+        with self.assertNumQueries(2):
+            rows = ''.join(response.streaming_content).splitlines()
+        self.assertEqual(rows[0], 'Order Number:,{}'.format(order.number))
+        self.assertEqual(rows[2], line.product.title)
+        self.assertEqual(rows[3], 'Code,Redemption URL')
+        self.assertTrue(rows[4].startswith('{},'.format(voucher.code)))
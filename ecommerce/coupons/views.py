@@ -6,7 +6,7 @@ import logging
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -30,12 +30,11 @@ from ecommerce.extensions.api import exceptions
 from ecommerce.extensions.basket.utils import prepare_basket
 from ecommerce.extensions.checkout.mixins import EdxOrderPlacementMixin
 from ecommerce.extensions.checkout.utils import get_receipt_page_url
-from ecommerce.extensions.voucher.utils import get_voucher_and_products_from_code
+from ecommerce.extensions.voucher.utils import get_cached_voucher, get_voucher_and_products_from_code
 
 Applicator = get_class('offer.utils', 'Applicator')
 Basket = get_model('basket', 'Basket')
 Benefit = get_model('offer', 'Benefit')
-ConditionalOffer = get_model('offer', 'ConditionalOffer')
 logger = logging.getLogger(__name__)
 OrderLineVouchers = get_model('voucher', 'OrderLineVouchers')
 Order = get_model('order', 'Order')
@@ -82,7 +81,12 @@ def voucher_is_valid(voucher, products, request):
             return False, _('Product [{product}] not available for purchase.'.format(product=products[0]))
 
     # If the voucher's number of applications exceeds it's limit.
-    offer = voucher.offers.first()
+    offer = voucher.original_offer
+    # The voucher may have come from the cache, so check the limit against the current application count, which
+    # changes with every redemption. The limit, status and dates of the offer only change when the coupon is edited,
+    # so they are at most VOUCHER_CACHE_TIMEOUT seconds old. The offers are loaded again from the database when the
+    # voucher is applied to the basket, so a stale value cannot let a redemption through.
+    offer.refresh_from_db(fields=['num_applications'])
     if offer.get_max_applications(request.user) == 0:
         return False, _('This coupon code is no longer available.')
 
@@ -154,13 +158,13 @@ class CouponRedeemView(EdxOrderPlacementMixin, View):
             return render(request, template_name, {'error': _('SKU not provided.')})
 
         try:
-            voucher = Voucher.objects.get(code=code)
+            voucher = get_cached_voucher(code)
         except Voucher.DoesNotExist:
             msg = 'No voucher found with code {code}'.format(code=code)
             return render(request, template_name, {'error': _(msg)})
 
         try:
-            product = StockRecord.objects.get(partner_sku=sku).product
+            product = StockRecord.objects.select_related('product__course').get(partner_sku=sku).product
         except StockRecord.DoesNotExist:
             return render(request, template_name, {'error': _('The product does not exist.')})
 
@@ -168,10 +172,10 @@ class CouponRedeemView(EdxOrderPlacementMixin, View):
         if not valid_voucher:
             return render(request, template_name, {'error': msg})
 
-        if not voucher.offers.first().is_email_valid(request.user.email):
+        if not voucher.original_offer.is_email_valid(request.user.email):
             return render(request, template_name, {'error': _('You are not eligible to use this coupon.')})
 
-        if not request.user.account_details(request).get('is_active'):
+        if not request.user.is_account_active(request):
             return render(
                 request,
                 'edx/email_confirmation_required.html',
@@ -242,6 +246,13 @@ class CouponRedeemView(EdxOrderPlacementMixin, View):
         return HttpResponseRedirect(reverse('basket:summary'))
 
 
+class _Echo(object):
+    """ File-like object that returns, rather than stores, the value written to it. """
+
+    def write(self, value):
+        return value
+
+
 class EnrollmentCodeCsvView(View):
     """ Download enrollment code CSV file view. """
 
@@ -269,7 +280,7 @@ class EnrollmentCodeCsvView(View):
             number (str): Number of the order
 
         Returns:
-            HttpResponse
+            StreamingHttpResponse
 
         Raises:
             Http404: When an order number for a non-existing order is passed.
@@ -277,36 +288,41 @@ class EnrollmentCodeCsvView(View):
 
         """
         try:
-            order = Order.objects.get(number=number)
+            # Only the order number and owner are needed to authorize the request and write the CSV.
+            order = Order.objects.only('number', 'user').get(number=number)
         except Order.DoesNotExist:
             raise Http404('Order not found.')
 
-        if request.user != order.user and not request.user.is_staff:
+        if order.user_id != request.user.id and not request.user.is_staff:
             raise PermissionDenied
 
         file_name = 'Enrollment code CSV order num {}'.format(order.number)
         file_name = '{filename}.csv'.format(filename=slugify(file_name))
 
-        response = HttpResponse(content_type='text/csv')
+        # The rows are generated after this method returns, so resolve the redemption URL while the request is
+        # still being handled.
+        redeem_url = '{url}?code='.format(url=get_ecommerce_url(reverse('coupons:offer')))
+
+        # Stream the rows so that orders with many enrollment codes are not buffered in memory.
+        response = StreamingHttpResponse(self._generate_csv_rows(order, redeem_url), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename={filename}'.format(filename=file_name)
+        return response
 
-        redeem_url = get_ecommerce_url(reverse('coupons:offer'))
+    def _generate_csv_rows(self, order, redeem_url):
+        """ Yields the formatted CSV rows for the enrollment codes of the given order. """
         voucher_field_names = ('Code', 'Redemption URL')
-        voucher_writer = csv.DictWriter(response, fieldnames=voucher_field_names)
+        writer = csv.writer(_Echo())
 
-        writer = csv.writer(response)
-        writer.writerow(('Order Number:', order.number))
-        writer.writerow([])
+        yield writer.writerow(('Order Number:', order.number))
+        yield writer.writerow([])
 
-        order_line_vouchers = OrderLineVouchers.objects.filter(line__order=order)
+        order_line_vouchers = OrderLineVouchers.objects.filter(line__order=order).select_related('line__product')
         for order_line_voucher in order_line_vouchers:
-            writer.writerow([order_line_voucher.line.product.title])
-            voucher_writer.writeheader()
-
-            for voucher in order_line_voucher.vouchers.all():
-                voucher_writer.writerow({
-                    voucher_field_names[0]: voucher.code,
-                    voucher_field_names[1]: '{url}?code={code}'.format(url=redeem_url, code=voucher.code)
-                })
-            writer.writerow([])
-        return response
+            yield writer.writerow([order_line_voucher.line.product.title])
+            yield writer.writerow(voucher_field_names)
+
+            # Read the codes of each line with iterator(), rather than prefetching the vouchers of every line,
+            # so that the vouchers of an order are not all loaded into memory at once.
+            for code in order_line_voucher.vouchers.values_list('code', flat=True).iterator():
+                yield writer.writerow((code, redeem_url + code))
+            yield writer.writerow([])
@@ -41,6 +41,17 @@ class EnterpriseUtilsTests(EnterpriseServiceMockMixin):
 
         self.assertEqual(TEST_ENTERPRISE_CUSTOMER_UUID, response.get('id'))
 
+    def test_get_enterprise_customer_cache(self):
+        """
+        Verify that "get_enterprise_customer" stores the enterprise customer in cache.
+        """
+        self.mock_access_token_response()
+        self.mock_specific_enterprise_customer_api(TEST_ENTERPRISE_CUSTOMER_UUID)
+        response = get_enterprise_customer(self.site, TEST_ENTERPRISE_CUSTOMER_UUID)
+
+        httpretty.disable()
+        self.assertEqual(get_enterprise_customer(self.site, TEST_ENTERPRISE_CUSTOMER_UUID), response)
+
     @mock_enterprise_api_client
     @ddt.data(
         (
@@ -8,13 +8,14 @@ from urllib import urlencode
 
 import waffle
 from django.conf import settings
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.utils.translation import ugettext as _
 from edx_rest_api_client.client import EdxRestApiClient
 from oscar.core.loading import get_model
 from slumber.exceptions import HttpNotFoundError
 
-from ecommerce.core.utils import traverse_pagination
+from ecommerce.core.utils import get_cache_key, traverse_pagination
 from ecommerce.enterprise.exceptions import EnterpriseDoesNotExist
 
 ConditionalOffer = get_model('offer', 'ConditionalOffer')
@@ -51,23 +52,39 @@ def get_enterprise_api_client(site):
 
 def get_enterprise_customer(site, uuid):
     """
-    Return a single enterprise customer
+    Return a single enterprise customer.
+
+    The enterprise customer is stored in cache, if it exists, to avoid calling the Enterprise service each
+    time the same customer is needed (e.g. multiple times while redeeming a coupon).
     """
+    resource = 'enterprise-customer'
+    cache_key = get_cache_key(
+        site_domain=site.domain,
+        resource=resource,
+        enterprise_customer_uuid=uuid,
+    )
+    enterprise_customer = cache.get(cache_key)
+    if enterprise_customer:
+        return enterprise_customer
+
     client = get_enterprise_api_client(site)
-    path = ['enterprise-customer', str(uuid)]
+    path = [resource, str(uuid)]
     client = reduce(getattr, path, client)
 
     try:
         response = client.get()
     except HttpNotFoundError:
         return None
-    return {
+
+    enterprise_customer = {
         'name': response['name'],
         'id': response['uuid'],
         'enable_data_sharing_consent': response['enable_data_sharing_consent'],
         'enforce_data_sharing_consent': response['enforce_data_sharing_consent'],
         'contact_email': response.get('contact_email', ''),
     }
+    cache.set(cache_key, enterprise_customer, settings.ENTERPRISE_API_CACHE_TIMEOUT)
+    return enterprise_customer
 
 
 def get_enterprise_customers(site):
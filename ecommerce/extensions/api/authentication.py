@@ -6,6 +6,19 @@ from ecommerce.core.url_utils import get_oauth2_provider_url
 
 
 class BearerAuthentication(BaseBearerAuthentication):
+    request = None
+
+    def authenticate(self, request):
+        # DRF instantiates authenticators for each request, so it is safe to hold on to the request here. This allows
+        # the user info URL to be built from the request's site, rather than looking up the request from threadlocals.
+        self.request = request
+        return super(BearerAuthentication, self).authenticate(request)
+
     def get_user_info_url(self):
         """ Returns the URL, hosted by the OAuth2 provider, from which user information can be pulled. """
-        return '{base}/user_info/'.format(base=get_oauth2_provider_url())
+        if self.request is None:
+            oauth2_provider_url = get_oauth2_provider_url()
+        else:
+            oauth2_provider_url = self.request.site.siteconfiguration.oauth2_provider_url
+
+        return '{base}/user_info/'.format(base=oauth2_provider_url)
@@ -47,3 +47,16 @@ class BearerAuthenticationTests(TestCase):
             actual = self.auth.get_user_info_url()
             expected = urljoin(self.site.siteconfiguration.lms_url_root, '/oauth2/user_info/')
             self.assertEqual(actual, expected)
+
+    def test_get_user_info_url_from_authenticated_request(self):
+        """ Verify the method uses the Site of the request being authenticated. """
+        request = self.create_request()
+        with mock.patch('edx_rest_framework_extensions.authentication.BearerAuthentication.authenticate'):
+            self.auth.authenticate(request)
+
+        with mock.patch('ecommerce.core.url_utils.get_current_request') as mock_get_current_request:
+            actual = self.auth.get_user_info_url()
+            self.assertFalse(mock_get_current_request.called)
+
+        expected = urljoin(self.site.siteconfiguration.lms_url_root, '/oauth2/user_info/')
+        self.assertEqual(actual, expected)
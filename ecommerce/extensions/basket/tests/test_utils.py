@@ -5,9 +5,9 @@ import ddt
 import mock
 import pytz
 from django.db import transaction
-from django.test import RequestFactory, TransactionTestCase
+from django.test import RequestFactory
 from oscar.core.loading import get_model
-from oscar.test.factories import BasketFactory, ProductFactory, RangeFactory, VoucherFactory
+from oscar.test.factories import ProductFactory, RangeFactory, VoucherFactory
 
 from ecommerce.core.constants import ENROLLMENT_CODE_PRODUCT_CLASS_NAME, ENROLLMENT_CODE_SWITCH
 from ecommerce.core.tests import toggle_switch
@@ -18,27 +18,72 @@ from ecommerce.extensions.partner.models import StockRecord
 from ecommerce.extensions.test.factories import prepare_voucher
 from ecommerce.referrals.models import Referral
 from ecommerce.tests.factories import SiteConfigurationFactory
-from ecommerce.tests.mixins import UserMixin
+from ecommerce.tests.mixins import TestDataUserMixin
 from ecommerce.tests.testcases import TestCase
 
-Benefit = get_model('offer', 'Benefit')
 Basket = get_model('basket', 'Basket')
 Product = get_model('catalogue', 'Product')
 
+UTM_COOKIE = {
+    'utm_source': 'test-source',
+    'utm_medium': 'test-medium',
+    'utm_campaign': 'test-campaign',
+    'utm_term': 'test-term',
+    'utm_content': 'test-content',
+    'created_at': 1475590280823,
+}
+UTM_COOKIE_JSON = json.dumps(UTM_COOKIE)
+UTM_COOKIE_CREATED_AT = datetime.datetime.fromtimestamp(UTM_COOKIE['created_at'] / float(1000), tz=pytz.UTC)
+
+# A cookie with only some of the UTM fields set, as used by the attribution transaction tests.
+PARTIAL_UTM_COOKIE_JSON = json.dumps({
+    'utm_campaign': UTM_COOKIE['utm_campaign'],
+    'utm_content': UTM_COOKIE['utm_content'],
+    'created_at': UTM_COOKIE['created_at'],
+})
+
+NEW_UTM_COOKIE = {
+    'utm_source': 'test-source-new',
+    'utm_medium': 'test-medium-new',
+    'utm_campaign': 'test-campaign-new',
+    'utm_term': 'test-term-new',
+    'utm_content': 'test-content-new',
+    'created_at': 1470590000000,
+}
+NEW_UTM_COOKIE_JSON = json.dumps(NEW_UTM_COOKIE)
+NEW_UTM_COOKIE_CREATED_AT = datetime.datetime.fromtimestamp(
+    NEW_UTM_COOKIE['created_at'] / float(1000), tz=pytz.UTC
+)
+
 
 @ddt.ddt
-class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
+class BasketUtilsTests(TestDataUserMixin, CourseCatalogTestMixin, TestCase):
     """ Tests for basket utility functions. """
+    request_factory = RequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        super(BasketUtilsTests, cls).setUpTestData()
+        toggle_switch(ENROLLMENT_CODE_SWITCH, True)
 
     def setUp(self):
         super(BasketUtilsTests, self).setUp()
-        self.request = RequestFactory()
+        self.request = self.request_factory.get('/')
         self.request.COOKIES = {}
-        self.request.user = self.create_user()
+        self.request.user = self.user
         site_configuration = SiteConfigurationFactory(partner__name='Tester')
         site_configuration.utm_cookie_name = 'test.edx.utm'
         self.request.site = site_configuration.site
 
+    def assert_referral_utm_data(self, referral, utm_cookie, expected_created_at):
+        """ Verify the referral contains the UTM data from the given cookie. """
+        self.assertEqual(referral.utm_source, utm_cookie['utm_source'])
+        self.assertEqual(referral.utm_medium, utm_cookie['utm_medium'])
+        self.assertEqual(referral.utm_campaign, utm_cookie['utm_campaign'])
+        self.assertEqual(referral.utm_term, utm_cookie['utm_term'])
+        self.assertEqual(referral.utm_content, utm_cookie['utm_content'])
+        self.assertEqual(referral.utm_created_at, expected_created_at)
+
     def test_prepare_basket_with_voucher(self):
         """ Verify a basket is returned and contains a voucher and the voucher is applied. """
         # Prepare a product with price of 100 and a voucher with 10% discount for that product.
@@ -52,8 +97,9 @@ class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
         basket = prepare_basket(self.request, [product], voucher)
         self.assertIsNotNone(basket)
         self.assertEqual(basket.status, Basket.OPEN)
-        self.assertEqual(basket.lines.count(), 1)
-        self.assertEqual(basket.lines.first().product, product)
+        lines = list(basket.lines.all())
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0].product, product)
         self.assertEqual(basket.vouchers.count(), 1)
         self.assertIsNotNone(basket.applied_offers())
         self.assertEqual(basket.total_discount, 10.00)
@@ -62,7 +108,6 @@ class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
     def test_prepare_basket_enrollment_with_voucher(self):
         """Verify the basket does not contain a voucher if enrollment code is added to it."""
         course = CourseFactory()
-        toggle_switch(ENROLLMENT_CODE_SWITCH, True)
         course.create_or_update_seat('verified', False, 10, self.partner, create_enrollment_code=True)
         enrollment_code = Product.objects.get(product_class__name=ENROLLMENT_CODE_PRODUCT_CLASS_NAME)
         voucher, product = prepare_voucher()
@@ -82,58 +127,61 @@ class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
         product = ProductFactory()
         voucher1 = VoucherFactory(code='FIRST')
         basket = prepare_basket(self.request, [product], voucher1)
-        self.assertEqual(basket.vouchers.count(), 1)
-        self.assertEqual(basket.vouchers.first(), voucher1)
+        self.assertEqual(list(basket.vouchers.all()), [voucher1])
 
         voucher2 = VoucherFactory(code='SECOND')
         new_basket = prepare_basket(self.request, [product], voucher2)
         self.assertEqual(basket, new_basket)
-        self.assertEqual(new_basket.vouchers.count(), 1)
-        self.assertEqual(new_basket.vouchers.first(), voucher2)
+        self.assertEqual(list(new_basket.vouchers.all()), [voucher2])
 
     def test_prepare_basket_without_voucher(self):
         """ Verify a basket is returned and does not contain a voucher. """
         product = ProductFactory()
-        basket = prepare_basket(self.request, [product])
+        with self.assertNumQueries(14):
+            basket = prepare_basket(self.request, [product])
         self.assertIsNotNone(basket)
         self.assertEqual(basket.status, Basket.OPEN)
-        self.assertEqual(basket.lines.count(), 1)
-        self.assertEqual(basket.lines.first().product, product)
+        lines = list(basket.lines.all())
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0].product, product)
         self.assertFalse(basket.vouchers.all())
         self.assertFalse(basket.applied_offers())
 
     def test_prepare_basket_with_multiple_products(self):
         """ Verify a basket is returned and only contains a single product. """
-        product1 = ProductFactory(stockrecords__partner__short_code='test1')
-        product2 = ProductFactory(stockrecords__partner__short_code='test2')
+        product1 = ProductFactory(stockrecords__partner=self.partner)
+        product2 = ProductFactory(stockrecords__partner=self.partner)
         basket = prepare_basket(self.request, [product1])
         basket = prepare_basket(self.request, [product2])
         self.assertIsNotNone(basket)
         self.assertEqual(basket.status, Basket.OPEN)
-        self.assertEqual(basket.lines.count(), 1)
-        self.assertEqual(basket.lines.first().product, product2)
+        lines = list(basket.lines.all())
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0].product, product2)
         self.assertEqual(basket.product_quantity(product2), 1)
 
-    def test_prepare_basket_calls_attribution_method(self):
+    @mock.patch('ecommerce.extensions.basket.utils.attribute_cookie_data')
+    def test_prepare_basket_calls_attribution_method(self, mock_attr_method):
         """ Verify a basket is returned and referral method called. """
-        with mock.patch('ecommerce.extensions.basket.utils.attribute_cookie_data') as mock_attr_method:
-            product = ProductFactory()
-            basket = prepare_basket(self.request, [product])
-            mock_attr_method.assert_called_with(basket, self.request)
+        product = ProductFactory()
+        basket = prepare_basket(self.request, [product])
+        mock_attr_method.assert_called_with(basket, self.request)
 
     def test_attribute_cookie_data_affiliate_cookie_lifecycle(self):
         """ Verify a basket is returned and referral captured if there is cookie info """
 
         # If there is no cookie info, verify no referral is created.
-        basket = BasketFactory(owner=self.request.user, site=self.request.site)
-        attribute_cookie_data(basket, self.request)
-        with self.assertRaises(Referral.DoesNotExist):
-            Referral.objects.get(basket=basket)
+        # Each call looks the referral up inside a savepoint, and writes at most once more.
+        basket = Basket.objects.create(owner=self.request.user, site=self.request.site)
+        with self.assertNumQueries(3):
+            attribute_cookie_data(basket, self.request)
+        self.assertFalse(Referral.objects.filter(basket_id=basket.id).exists())
 
         # If there is cookie info, verify a referral is captured
         affiliate_id = 'test_affiliate'
         self.request.COOKIES['affiliate_id'] = affiliate_id
-        attribute_cookie_data(basket, self.request)
+        with self.assertNumQueries(4):
+            attribute_cookie_data(basket, self.request)
         # test affiliate id from cookie saved in referral
         referral = Referral.objects.get(basket_id=basket.id)
         self.assertEqual(referral.affiliate_id, affiliate_id)
@@ -141,123 +189,58 @@ class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
         # update cookie
         new_affiliate_id = 'new_affiliate'
         self.request.COOKIES['affiliate_id'] = new_affiliate_id
-        attribute_cookie_data(basket, self.request)
+        with self.assertNumQueries(4):
+            attribute_cookie_data(basket, self.request)
 
         # test new affiliate id saved
-        referral = Referral.objects.get(basket_id=basket.id)
+        referral.refresh_from_db()
         self.assertEqual(referral.affiliate_id, new_affiliate_id)
 
         # expire cookie
         del self.request.COOKIES['affiliate_id']
-        attribute_cookie_data(basket, self.request)
+        with self.assertNumQueries(4):
+            attribute_cookie_data(basket, self.request)
 
         # test referral record is deleted when no cookie set
-        with self.assertRaises(Referral.DoesNotExist):
-            Referral.objects.get(basket_id=basket.id)
+        self.assertFalse(Referral.objects.filter(basket_id=basket.id).exists())
 
     def test_attribute_cookie_data_utm_cookie_lifecycle(self):
         """ Verify a basket is returned and referral captured. """
-        utm_source = 'test-source'
-        utm_medium = 'test-medium'
-        utm_campaign = 'test-campaign'
-        utm_term = 'test-term'
-        utm_content = 'test-content'
-        utm_created_at = 1475590280823
-        expected_created_at = datetime.datetime.fromtimestamp(int(utm_created_at) / float(1000), tz=pytz.UTC)
-
-        utm_cookie = {
-            'utm_source': utm_source,
-            'utm_medium': utm_medium,
-            'utm_campaign': utm_campaign,
-            'utm_term': utm_term,
-            'utm_content': utm_content,
-            'created_at': utm_created_at,
-        }
-
-        self.request.COOKIES['test.edx.utm'] = json.dumps(utm_cookie)
-        basket = BasketFactory(owner=self.request.user, site=self.request.site)
+        self.request.COOKIES['test.edx.utm'] = UTM_COOKIE_JSON
+        basket = Basket.objects.create(owner=self.request.user, site=self.request.site)
         attribute_cookie_data(basket, self.request)
 
         # test utm data from cookie saved in referral
         referral = Referral.objects.get(basket_id=basket.id)
-        self.assertEqual(referral.utm_source, utm_source)
-        self.assertEqual(referral.utm_medium, utm_medium)
-        self.assertEqual(referral.utm_campaign, utm_campaign)
-        self.assertEqual(referral.utm_term, utm_term)
-        self.assertEqual(referral.utm_content, utm_content)
-        self.assertEqual(referral.utm_created_at, expected_created_at)
+        self.assert_referral_utm_data(referral, UTM_COOKIE, UTM_COOKIE_CREATED_AT)
 
         # update cookie
-        utm_source = 'test-source-new'
-        utm_medium = 'test-medium-new'
-        utm_campaign = 'test-campaign-new'
-        utm_term = 'test-term-new'
-        utm_content = 'test-content-new'
-        utm_created_at = 1470590000000
-        expected_created_at = datetime.datetime.fromtimestamp(int(utm_created_at) / float(1000), tz=pytz.UTC)
-
-        new_utm_cookie = {
-            'utm_source': utm_source,
-            'utm_medium': utm_medium,
-            'utm_campaign': utm_campaign,
-            'utm_term': utm_term,
-            'utm_content': utm_content,
-            'created_at': utm_created_at,
-        }
-        self.request.COOKIES['test.edx.utm'] = json.dumps(new_utm_cookie)
+        self.request.COOKIES['test.edx.utm'] = NEW_UTM_COOKIE_JSON
         attribute_cookie_data(basket, self.request)
 
         # test new utm data saved
-        referral = Referral.objects.get(basket_id=basket.id)
-        self.assertEqual(referral.utm_source, utm_source)
-        self.assertEqual(referral.utm_medium, utm_medium)
-        self.assertEqual(referral.utm_campaign, utm_campaign)
-        self.assertEqual(referral.utm_term, utm_term)
-        self.assertEqual(referral.utm_content, utm_content)
-        self.assertEqual(referral.utm_created_at, expected_created_at)
+        referral.refresh_from_db()
+        self.assert_referral_utm_data(referral, NEW_UTM_COOKIE, NEW_UTM_COOKIE_CREATED_AT)
 
         # expire cookie
         del self.request.COOKIES['test.edx.utm']
         attribute_cookie_data(basket, self.request)
 
         # test referral record is deleted when no cookie set
-        with self.assertRaises(Referral.DoesNotExist):
-            Referral.objects.get(basket_id=basket.id)
+        self.assertFalse(Referral.objects.filter(basket_id=basket.id).exists())
 
     def test_attribute_cookie_data_multiple_cookies(self):
         """ Verify a basket is returned and referral captured. """
-        utm_source = 'test-source'
-        utm_medium = 'test-medium'
-        utm_campaign = 'test-campaign'
-        utm_term = 'test-term'
-        utm_content = 'test-content'
-        utm_created_at = 1475590280823
-
-        utm_cookie = {
-            'utm_source': utm_source,
-            'utm_medium': utm_medium,
-            'utm_campaign': utm_campaign,
-            'utm_term': utm_term,
-            'utm_content': utm_content,
-            'created_at': utm_created_at,
-        }
-
         affiliate_id = 'affiliate'
 
-        self.request.COOKIES['test.edx.utm'] = json.dumps(utm_cookie)
+        self.request.COOKIES['test.edx.utm'] = UTM_COOKIE_JSON
         self.request.COOKIES['affiliate_id'] = affiliate_id
-        basket = BasketFactory(owner=self.request.user, site=self.request.site)
+        basket = Basket.objects.create(owner=self.request.user, site=self.request.site)
         attribute_cookie_data(basket, self.request)
 
         # test affiliate id & UTM data from cookie saved in referral
         referral = Referral.objects.get(basket_id=basket.id)
-        expected_created_at = datetime.datetime.fromtimestamp(int(utm_created_at) / float(1000), tz=pytz.UTC)
-        self.assertEqual(referral.utm_source, utm_source)
-        self.assertEqual(referral.utm_medium, utm_medium)
-        self.assertEqual(referral.utm_campaign, utm_campaign)
-        self.assertEqual(referral.utm_term, utm_term)
-        self.assertEqual(referral.utm_content, utm_content)
-        self.assertEqual(referral.utm_created_at, expected_created_at)
+        self.assert_referral_utm_data(referral, UTM_COOKIE, UTM_COOKIE_CREATED_AT)
         self.assertEqual(referral.affiliate_id, affiliate_id)
 
         # expire 1 cookie
@@ -265,7 +248,7 @@ class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
         attribute_cookie_data(basket, self.request)
 
         # test affiliate id still saved in referral but utm data removed
-        referral = Referral.objects.get(basket_id=basket.id)
+        referral.refresh_from_db()
         self.assertEqual(referral.utm_source, '')
         self.assertEqual(referral.utm_medium, '')
         self.assertEqual(referral.utm_campaign, '')
@@ -279,14 +262,15 @@ class BasketUtilsTests(CourseCatalogTestMixin, TestCase):
         attribute_cookie_data(basket, self.request)
 
         # test referral record is deleted when no cookies are set
-        with self.assertRaises(Referral.DoesNotExist):
-            Referral.objects.get(basket_id=basket.id)
+        self.assertFalse(Referral.objects.filter(basket_id=basket.id).exists())
 
 
-class BasketUtilsTransactionTests(UserMixin, TransactionTestCase):
+class BasketUtilsTransactionTests(TestCase):
+    request_factory = RequestFactory()
+
     def setUp(self):
         super(BasketUtilsTransactionTests, self).setUp()
-        self.request = RequestFactory()
+        self.request = self.request_factory.get('/')
         self.request.COOKIES = {}
         self.request.user = self.create_user()
         site_configuration = SiteConfigurationFactory(partner__name='Tester')
@@ -294,25 +278,16 @@ class BasketUtilsTransactionTests(UserMixin, TransactionTestCase):
         self.request.site = site_configuration.site
 
     def _setup_request_cookie(self):
-        utm_campaign = 'test-campaign'
-        utm_content = 'test-content'
-        utm_created_at = 1475590280823
-
-        utm_cookie = {
-            'utm_campaign': utm_campaign,
-            'utm_content': utm_content,
-            'created_at': utm_created_at,
-        }
-
-        affiliate_id = 'affiliate'
-
-        self.request.COOKIES['test.edx.utm'] = json.dumps(utm_cookie)
-        self.request.COOKIES['affiliate_id'] = affiliate_id
+        self.request.COOKIES['test.edx.utm'] = PARTIAL_UTM_COOKIE_JSON
+        self.request.COOKIES['affiliate_id'] = 'affiliate'
 
     def test_attribution_atomic_transaction(self):
         """
         Verify that an IntegrityError raised while creating a referral
         does not prevent a basket from being created.
+
+        attribute_cookie_data wraps its work in a savepoint, so the conflict can be
+        exercised inside the transaction TestCase already opens for each test.
         """
         self._setup_request_cookie()
         product = ProductFactory()
@@ -335,5 +310,6 @@ class BasketUtilsTransactionTests(UserMixin, TransactionTestCase):
         self.assertIsNotNone(basket)
         self.assertTrue(basket.id > 0)
         self.assertEqual(basket.status, Basket.OPEN)
-        self.assertEqual(basket.lines.count(), 1)
-        self.assertEqual(basket.lines.first().product, product)
+        lines = list(basket.lines.all())
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0].product, product)
@@ -12,8 +12,9 @@ from django.contrib.messages import get_messages
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseRedirect
-from django.test import override_settings
+from django.test import SimpleTestCase, override_settings
 from factory.fuzzy import FuzzyText
+from freezegun import freeze_time
 from oscar.apps.basket.forms import BasketVoucherForm
 from oscar.core.loading import get_class, get_model
 from oscar.test import newfactories as factories
@@ -38,7 +39,7 @@ from ecommerce.extensions.payment.forms import PaymentForm
 from ecommerce.extensions.payment.tests.processors import DummyProcessor
 from ecommerce.extensions.test.factories import prepare_voucher
 from ecommerce.tests.factories import ProductFactory, StockRecordFactory
-from ecommerce.tests.mixins import ApiMockMixin, LmsApiMockMixin
+from ecommerce.tests.mixins import ApiMockMixin, LmsApiMockMixin, TestDataUserMixin
 from ecommerce.tests.testcases import TestCase
 
 Applicator = get_class('offer.utils', 'Applicator')
@@ -56,20 +57,26 @@ VoucherAddView = get_class('basket.views', 'VoucherAddView')
 VoucherApplication = get_model('voucher', 'VoucherApplication')
 VoucherRemoveView = get_class('basket.views', 'VoucherRemoveView')
 
+BASKET_SUMMARY_PATH = reverse('basket:summary')
 COUPON_CODE = 'COUPONTEST'
 
 
 @ddt.ddt
-class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatalogMockMixin, LmsApiMockMixin, TestCase):
+class BasketSingleItemViewTests(
+        TestDataUserMixin, CouponMixin, CourseCatalogTestMixin, CourseCatalogMockMixin, LmsApiMockMixin, TestCase
+):
     """ BasketSingleItemView view tests. """
     path = reverse('basket:single-item')
 
+    @classmethod
+    def setUpTestData(cls):
+        super(BasketSingleItemViewTests, cls).setUpTestData()
+        cls.course = CourseFactory()
+
     def setUp(self):
         super(BasketSingleItemViewTests, self).setUp()
-        self.user = self.create_user()
         self.client.login(username=self.user.username, password=self.password)
 
-        self.course = CourseFactory()
         self.course.create_or_update_seat('verified', True, 50, self.partner)
         product = self.course.create_or_update_seat('verified', False, 0, self.partner)
         self.stock_record = StockRecordFactory(product=product, partner=self.partner)
@@ -114,12 +121,12 @@ class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatal
         """ The view should return HTTP 400 if no SKU is provided. """
         response = self.client.get(self.path)
         self.assertEqual(response.status_code, 400)
-        self.assertEqual(response.content, 'No SKU provided.')
+        self.assertEqual(response.content, b'No SKU provided.')
 
     def test_missing_product(self):
         """ The view should return HTTP 400 if SKU has no associated product. """
         sku = 'NONEXISTING'
-        expected_content = 'SKU [{}] does not exist.'.format(sku)
+        expected_content = 'SKU [{}] does not exist.'.format(sku).encode('utf-8')
         url = '{path}?sku={sku}'.format(path=self.path, sku=sku)
         response = self.client.get(url)
         self.assertEqual(response.status_code, 400)
@@ -161,7 +168,7 @@ class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatal
         self.mock_dynamic_catalog_course_runs_api(course_run=self.course)
         self.mock_enrollment_api_success_unenrolled(self.course.id, mode='verified')
         response = self.client.get(url)
-        expected_url = self.get_full_url(reverse('basket:summary'))
+        expected_url = self.get_full_url(BASKET_SUMMARY_PATH)
         self.assertRedirects(response, expected_url, status_code=303)
 
     @httpretty.activate
@@ -173,7 +180,7 @@ class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatal
         product.save()
         self.assertFalse(Selector().strategy().fetch_for_product(product).availability.is_available_to_buy)
 
-        expected_content = 'Product [{}] not available to buy.'.format(product.title)
+        expected_content = 'Product [{}] not available to buy.'.format(product.title).encode('utf-8')
         url = '{path}?sku={sku}'.format(path=self.path, sku=self.stock_record.partner_sku)
         response = self.client.get(url)
         self.assertEqual(response.status_code, 400)
@@ -191,14 +198,15 @@ class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatal
         url = '{path}?sku={sku}&code={code}'.format(path=self.path, sku=self.stock_record.partner_sku,
                                                     code=COUPON_CODE)
         response = self.client.get(url)
-        expected_url = self.get_full_url(reverse('basket:summary'))
+        expected_url = self.get_full_url(BASKET_SUMMARY_PATH)
         self.assertRedirects(response, expected_url, status_code=303)
 
         basket = Basket.objects.get(owner=self.user, site=self.site)
         self.assertEqual(basket.status, Basket.OPEN)
-        self.assertEqual(basket.lines.count(), 1)
+        lines = list(basket.lines.all())
+        self.assertEqual(len(lines), 1)
         self.assertTrue(basket.contains_a_voucher)
-        self.assertEqual(basket.lines.first().product, self.stock_record.product)
+        self.assertEqual(lines[0].product, self.stock_record.product)
 
     @httpretty.activate
     @ddt.data(('verified', False), ('professional', True), ('no-id-professional', False))
@@ -217,7 +225,7 @@ class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatal
         self.create_coupon(catalog=catalog, code=COUPON_CODE, benefit_value=5)
 
         url = '{path}?sku={sku}&code={code}'.format(path=self.path, sku=stock_record.partner_sku, code=COUPON_CODE)
-        expected_content = 'You are already enrolled in {product}.'.format(product=product.course.name)
+        expected_content = 'You are already enrolled in {product}.'.format(product=product.course.name).encode('utf-8')
         response = self.client.get(url)
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.content, expected_content)
@@ -259,21 +267,19 @@ class BasketSingleItemViewTests(CouponMixin, CourseCatalogTestMixin, CourseCatal
 
 
 @ddt.ddt
-class BasketMultipleItemsViewTests(CourseCatalogTestMixin, TestCase):
+class BasketMultipleItemsViewTests(TestDataUserMixin, CourseCatalogTestMixin, TestCase):
     """ BasketMultipleItemsView view tests. """
     path = reverse('basket:add-multi')
 
     def setUp(self):
         super(BasketMultipleItemsViewTests, self).setUp()
-        self.user = self.create_user()
         self.client.login(username=self.user.username, password=self.password)
 
     def test_add_multiple_products_to_basket(self):
         """ Verify the basket accepts multiple products. """
         products = ProductFactory.create_batch(3, stockrecords__partner=self.partner)
-        qs = urllib.urlencode({'sku': [product.stockrecords.first().partner_sku for product in products]}, True)
-        url = '{root}?{qs}'.format(root=self.path, qs=qs)
-        response = self.client.get(url)
+        skus = StockRecord.objects.filter(product__in=products).values_list('partner_sku', flat=True)
+        response = self.client.get(self.path, data={'sku': list(skus)})
         self.assertEqual(response.status_code, 303)
 
         basket = response.wsgi_request.basket
@@ -284,13 +290,13 @@ class BasketMultipleItemsViewTests(CourseCatalogTestMixin, TestCase):
         """ Verify the Bad request exception is thrown when no skus are provided. """
         response = self.client.get(self.path)
         self.assertEqual(response.status_code, 400)
-        self.assertEqual(response.content, 'No SKUs provided.')
+        self.assertEqual(response.content, b'No SKUs provided.')
 
     def test_add_multiple_products_no_available_products(self):
         """ Verify the Bad request exception is thrown when no skus are provided. """
         response = self.client.get(self.path, data=[('sku', 1), ('sku', 2)])
         self.assertEqual(response.status_code, 400)
-        self.assertEqual(response.content, 'Products with SKU(s) [1, 2] do not exist.')
+        self.assertEqual(response.content, b'Products with SKU(s) [1, 2] do not exist.')
 
     @ddt.data(Voucher.SINGLE_USE, Voucher.MULTI_USE)
     def test_add_multiple_products_and_use_voucher(self, usage):
@@ -302,12 +308,8 @@ class BasketMultipleItemsViewTests(CourseCatalogTestMixin, TestCase):
             benefit=factories.BenefitFactory(range=product_range),
             condition=factories.ConditionFactory(range=product_range)
         ))
-        qs = urllib.urlencode({
-            'sku': [product.stockrecords.first().partner_sku for product in products],
-            'code': voucher.code
-        }, True)
-        url = '{root}?{qs}'.format(root=self.path, qs=qs)
-        response = self.client.get(url)
+        skus = StockRecord.objects.filter(product__in=products).values_list('partner_sku', flat=True)
+        response = self.client.get(self.path, data={'sku': list(skus), 'code': voucher.code})
         self.assertEqual(response.status_code, 303)
         basket = response.wsgi_request.basket
         self.assertEqual(basket.status, Basket.OPEN)
@@ -316,23 +318,30 @@ class BasketMultipleItemsViewTests(CourseCatalogTestMixin, TestCase):
 
 @httpretty.activate
 @ddt.ddt
-class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, LmsApiMockMixin, ApiMockMixin, TestCase):
+@override_settings(PAYMENT_PROCESSORS=['ecommerce.extensions.payment.tests.processors.DummyProcessor'])
+class BasketSummaryViewTests(
+        TestDataUserMixin, CourseCatalogTestMixin, CourseCatalogMockMixin, LmsApiMockMixin, ApiMockMixin, TestCase
+):
     """ BasketSummaryView basket view tests. """
-    path = reverse('basket:summary')
+    path = BASKET_SUMMARY_PATH
+
+    @classmethod
+    def setUpTestData(cls):
+        super(BasketSummaryViewTests, cls).setUpTestData()
+        cls.course = CourseFactory(name='BasketSummaryTest')
+        toggle_switch(settings.PAYMENT_PROCESSOR_SWITCH_PREFIX + DummyProcessor.NAME, True)
+        toggle_switch(ENROLLMENT_CODE_SWITCH, True)
 
     def setUp(self):
         super(BasketSummaryViewTests, self).setUp()
-        self.user = self.create_user()
         self.client.login(username=self.user.username, password=self.password)
-        self.course = CourseFactory(name='BasketSummaryTest')
-        site_configuration = self.site.siteconfiguration
 
+        # SiteMixin creates a new site for each test, so its configuration cannot be shared across the class.
+        site_configuration = self.site.siteconfiguration
         site_configuration.payment_processors = DummyProcessor.NAME
         site_configuration.client_side_payment_processor = DummyProcessor.NAME
         site_configuration.save()
 
-        toggle_switch(settings.PAYMENT_PROCESSOR_SWITCH_PREFIX + DummyProcessor.NAME, True)
-
     def create_basket_and_add_product(self, product):
         basket = factories.BasketFactory(owner=self.user, site=self.site)
         basket.add_product(product, 1)
@@ -348,7 +357,7 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         Applicator().apply(basket)
 
     def prepare_course_seat_and_enrollment_code(self, seat_type='verified', id_verification=False):
-        """Helper function that creates a new course, enables enrollment codes and creates a new
+        """Helper function that creates a new course, enables enrollment codes for the site and creates a new
         seat and enrollment code for it.
 
         Args:
@@ -358,7 +367,6 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
             The newly created course, seat and enrollment code.
         """
         course = CourseFactory()
-        toggle_switch(ENROLLMENT_CODE_SWITCH, True)
         self.site.siteconfiguration.enable_enrollment_codes = True
         self.site.siteconfiguration.save()
         seat = course.create_or_update_seat(seat_type, id_verification, 10, self.partner, create_enrollment_code=True)
@@ -369,8 +377,7 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
     def test_course_api_failure(self, error):
         """ Verify a connection error and timeout are logged when they happen. """
         seat = self.create_seat(self.course)
-        basket = self.create_basket_and_add_product(seat)
-        self.assertEqual(basket.lines.count(), 1)
+        self.create_basket_and_add_product(seat)
 
         logger_name = 'ecommerce.extensions.basket.views'
         self.mock_api_error(
@@ -417,7 +424,7 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         """Verify response does not contain variables for the switch link if seat does not have an EC."""
         no_ec_course = CourseFactory()
         seat_without_ec = no_ec_course.create_or_update_seat('verified', False, 10, self.partner)
-        self.create_basket_and_add_product(seat_without_ec)
+        basket = self.create_basket_and_add_product(seat_without_ec)
         self.mock_dynamic_catalog_course_runs_api(course_run=no_ec_course)
 
         response = self.client.get(self.path)
@@ -425,7 +432,7 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         self.assertFalse(response.context['partner_sku'])
 
         ec_course, seat_with_ec, enrollment_code = self.prepare_course_seat_and_enrollment_code()
-        Basket.objects.all().delete()
+        basket.delete()
         self.create_basket_and_add_product(seat_with_ec)
         self.mock_dynamic_catalog_course_runs_api(course_run=ec_course)
 
@@ -452,19 +459,18 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
     )
     @ddt.unpack
     @mock_course_catalog_api_client
-    @override_settings(PAYMENT_PROCESSORS=['ecommerce.extensions.payment.tests.processors.DummyProcessor'])
     def test_response_success(self, benefit_type, benefit_value):
         """ Verify a successful response is returned. """
         seat = self.create_seat(self.course, 500)
         basket = self.create_basket_and_add_product(seat)
         self.create_and_apply_benefit_to_basket(basket, seat, benefit_type, benefit_value)
 
-        self.assertEqual(basket.lines.count(), 1)
         self.mock_dynamic_catalog_single_course_runs_api(self.course)
 
         benefit, __ = Benefit.objects.get_or_create(type=benefit_type, value=benefit_value)
 
-        response = self.client.get(self.path)
+        with self.assertNumQueries(58):
+            response = self.client.get(self.path)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['formset_lines_data']), 1)
         line_data = response.context['formset_lines_data'][0][1]
@@ -496,7 +502,8 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         seat_without_benefit = self.create_seat(course_without_benefit)
         basket.add_product(seat_without_benefit, 1)
 
-        response = self.client.get(self.path)
+        with self.assertNumQueries(65):
+            response = self.client.get(self.path)
         lines = response.context['formset_lines_data']
         self.assertEqual(lines[0][1]['benefit_value'], '50%')
         self.assertEqual(lines[1][1]['benefit_value'], None)
@@ -505,8 +512,7 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
     def test_cached_course(self):
         """ Verify that the course info is cached. """
         seat = self.create_seat(self.course, 50)
-        basket = self.create_basket_and_add_product(seat)
-        self.assertEqual(basket.lines.count(), 1)
+        self.create_basket_and_add_product(seat)
         self.mock_dynamic_catalog_single_course_runs_api(self.course)
 
         cache_key = 'courses_api_detail_{}{}'.format(self.course.id, self.site.siteconfiguration.partner.short_code)
@@ -514,7 +520,8 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         cached_course_before = cache.get(cache_key)
         self.assertIsNone(cached_course_before)
 
-        response = self.client.get(self.path)
+        with self.assertNumQueries(32):
+            response = self.client.get(self.path)
         self.assertEqual(response.status_code, 200)
         cached_course_after = cache.get(cache_key)
         self.assertEqual(cached_course_after['title'], self.course.name)
@@ -579,7 +586,6 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         self.assert_order_details_in_context(enrollment_code)
 
     @override_flag(CLIENT_SIDE_CHECKOUT_FLAG_NAME, active=True)
-    @override_settings(PAYMENT_PROCESSORS=['ecommerce.extensions.payment.tests.processors.DummyProcessor'])
     def test_client_side_checkout(self):
         """ Verify the view returns the data necessary to initiate client-side checkout. """
         seat = self.create_seat(self.course)
@@ -624,7 +630,6 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
     )
     @ddt.unpack
     @mock_course_catalog_api_client
-    @override_settings(PAYMENT_PROCESSORS=['ecommerce.extensions.payment.tests.processors.DummyProcessor'])
     def test_context_data_contains_course_dates(self, date_string, expected_result):
         seat = self.create_seat(self.course)
         self.create_basket_and_add_product(seat)
@@ -661,12 +666,11 @@ class BasketSummaryViewTests(CourseCatalogTestMixin, CourseCatalogMockMixin, Lms
         )
 
 
-class VoucherAddViewTests(TestCase):
+class VoucherAddViewTests(TestDataUserMixin, TestCase):
     """ Tests for VoucherAddView. """
 
     def setUp(self):
         super(VoucherAddViewTests, self).setUp()
-        self.user = self.create_user()
         self.client.login(username=self.user.username, password=self.password)
         self.basket = factories.BasketFactory(owner=self.user, site=self.site)
 
@@ -703,10 +707,12 @@ class VoucherAddViewTests(TestCase):
         self.assert_form_valid_message(
             "You have already added coupon code '{code}' to your basket.".format(code=COUPON_CODE))
 
+    @freeze_time('2017-01-15')
     def test_voucher_expired_error_msg(self):
         """ Verify correct error message is returned when voucher has expired. """
-        end_datetime = datetime.datetime.now() - datetime.timedelta(days=1)
-        start_datetime = datetime.datetime.now() - datetime.timedelta(days=2)
+        now = datetime.datetime.now()
+        end_datetime = now - datetime.timedelta(days=1)
+        start_datetime = now - datetime.timedelta(days=2)
         factories.VoucherFactory(code=COUPON_CODE, end_datetime=end_datetime, start_datetime=start_datetime)
         self.assert_form_valid_message("Coupon code '{code}' has expired.".format(code=COUPON_CODE))
 
@@ -728,12 +734,7 @@ class VoucherAddViewTests(TestCase):
         VoucherApplication.objects.create(voucher=voucher, user=self.user, order=order)
         self.assert_form_valid_message("Coupon code '{code}' has already been redeemed.".format(code=COUPON_CODE))
 
-    def test_form_valid_without_basket_id(self):
-        """ Verify the view redirects to the basket summary view if the basket has no ID.  """
-        self.request.basket = Basket()
-        response = self.view.form_valid(self.form)
-        self.assertEqual(response.url, reverse('basket:summary'))
-
+    @freeze_time('2017-01-15')
     def test_inactive_voucher(self):
         """ Verify the view alerts the user if the voucher is inactive. """
         code = FuzzyText().fuzz()
@@ -767,14 +768,16 @@ class VoucherAddViewTests(TestCase):
         for part in expected_url_parts:
             self.assertIn(part, resp.url)
 
-    def assert_basket_discounts(self, expected_offer_discounts=None, expected_voucher_discounts=None):
+    def assert_basket_discounts(self, num_queries, expected_offer_discounts=None, expected_voucher_discounts=None):
         """Helper to determine if the expected offer is applied to a basket.
         The basket is retrieved from the response because Oscar uses
-        SimpleLazyObjects to operate with baskets."""
+        SimpleLazyObjects to operate with baskets. The summary request
+        must make exactly num_queries queries."""
         expected_offer_discounts = expected_offer_discounts or []
         expected_voucher_discounts = expected_voucher_discounts or []
 
-        response = self.client.get(reverse('basket:summary'))
+        with self.assertNumQueries(num_queries):
+            response = self.client.get(BASKET_SUMMARY_PATH)
         basket = response.context['basket']
 
         actual_offer_discounts = [discount['offer'] for discount in basket.offer_discounts]
@@ -802,15 +805,28 @@ class VoucherAddViewTests(TestCase):
         )
         self.basket.add_product(product)
         # Only site offer is applied to the basket.
-        self.assert_basket_discounts([site_offer])
+        self.assert_basket_discounts(num_queries=29, expected_offer_discounts=[site_offer])
 
         # Only the voucher offer is applied to the basket.
         self.client.post(reverse('basket:vouchers-add'), data={'code': voucher.code})
-        self.assert_basket_discounts(expected_voucher_discounts=[voucher.offers.first()])
+        self.assert_basket_discounts(num_queries=48, expected_voucher_discounts=[voucher.offers.first()])
 
         # Site offer discount is still present after removing voucher.
         self.client.post(reverse('basket:vouchers-remove', kwargs={'pk': voucher.id}))
-        self.assert_basket_discounts([site_offer])
+        self.assert_basket_discounts(num_queries=26, expected_offer_discounts=[site_offer])
+
+
+class VoucherAddViewNoBasketTests(SimpleTestCase):
+    """ Tests for VoucherAddView that do not require a database, site, or saved basket. """
+
+    def test_form_valid_without_basket_id(self):
+        """ Verify the view redirects to the basket summary view if the basket has no ID.  """
+        view = VoucherAddView()
+        view.request = RequestFactory().post('/')
+        form = BasketVoucherForm()
+        form.cleaned_data = {'code': COUPON_CODE}
+        response = view.form_valid(form)
+        self.assertEqual(response.url, BASKET_SUMMARY_PATH)
 
 
 class VoucherRemoveViewTests(TestCase):
@@ -56,6 +56,17 @@ class UtilsTests(CourseCatalogTestMixin, TestCase):
         actual = generate_sku(product, self.partner)
         self.assertEqual(actual, expected)
 
+    def test_generate_sku_with_non_ascii_attribute(self):
+        """Verify the method generates a SKU when a product attribute contains non-ASCII characters."""
+        course_id = 'sku/test/course'
+        course = Course.objects.create(id=course_id, name='Test Course')
+        credit_provider = 'prövider'
+        product = course.create_or_update_seat('credit', True, 0, self.partner, credit_provider=credit_provider)
+
+        _hash = '{} {} {} {} {}'.format('credit', course_id, 'True', credit_provider, self.partner.id)
+        expected = md5(_hash.lower().encode('utf-8')).hexdigest()[-7:].upper()
+        self.assertEqual(generate_sku(product, self.partner), expected)
+
     def test_get_or_create_catalog(self):
         """Verify that the proper catalog is fetched."""
         stock_record = self.seat.stockrecords.first()
@@ -84,6 +95,17 @@ class UtilsTests(CourseCatalogTestMixin, TestCase):
         self.assertNotEqual(self.catalog, new_catalog)
         self.assertEqual(Catalog.objects.count(), 2)
 
+    def test_get_or_create_catalog_missing_stock_record(self):
+        """Verify an error is raised if any of the stock records does not exist."""
+        stock_record = self.seat.stockrecords.first()
+        with self.assertRaises(StockRecord.DoesNotExist):
+            get_or_create_catalog(
+                name='Test',
+                partner=self.partner,
+                stock_record_ids=[stock_record.id, stock_record.id + 1000]
+            )
+        self.assertEqual(Catalog.objects.count(), 1)
+
 
 class CouponUtilsTests(CouponMixin, CourseCatalogTestMixin, TestCase):
     def setUp(self):
@@ -153,7 +153,8 @@ def generate_sku(product, partner):
     else:
         raise Exception('Unexpected product class')
 
-    md5_hash = md5(_hash.lower())
+    # Encode explicitly; attribute values such as the credit provider may contain non-ASCII characters.
+    md5_hash = md5(_hash.lower().encode('utf-8'))
     digest = md5_hash.hexdigest()[-7:]
 
     return digest.upper()
@@ -164,15 +165,15 @@ def get_or_create_catalog(name, partner, stock_record_ids):
     Returns the catalog which has the same name, partner and stock records.
     If there isn't one with that data, creates and returns a new one.
     """
-    catalogs = Catalog.objects.all()
-    stock_records = [StockRecord.objects.get(id=id) for id in stock_record_ids]  # pylint: disable=redefined-builtin
+    stock_records = set(StockRecord.objects.filter(id__in=stock_record_ids))
+    if len(stock_records) != len(set(stock_record_ids)):
+        raise StockRecord.DoesNotExist('StockRecord matching query does not exist.')
 
+    catalogs = Catalog.objects.filter(name=name, partner=partner).prefetch_related('stock_records')
     for catalog in catalogs:
-        if catalog.name == name and catalog.partner == partner:
-            if set(catalog.stock_records.all()) == set(stock_records):
-                return catalog, False
+        if set(catalog.stock_records.all()) == stock_records:
+            return catalog, False
 
     catalog = Catalog.objects.create(name=name, partner=partner)
-    for stock_record in stock_records:
-        catalog.stock_records.add(stock_record)
+    catalog.stock_records.add(*stock_records)
     return catalog, True
@@ -62,8 +62,9 @@ def send_course_purchase_email(sender, order=None, **kwargs):  # pylint: disable
     """Send course purchase notification email when a course is purchased."""
     if waffle.switch_is_active('ENABLE_NOTIFICATIONS'):
         # We do not currently support email sending for orders with more than one item.
-        if len(order.lines.all()) == ORDER_LINE_COUNT:
-            product = order.lines.first().product
+        lines = order.lines.select_related('product').all()
+        if len(lines) == ORDER_LINE_COUNT:
+            product = lines[0].product
             credit_provider_id = getattr(product.attr, 'credit_provider', None)
             if not credit_provider_id:
                 logger.error(
@@ -13,26 +13,39 @@ from ecommerce.extensions.checkout.exceptions import BasketNotFreeError
 from ecommerce.extensions.checkout.utils import get_receipt_page_url
 from ecommerce.extensions.checkout.views import ReceiptResponseView
 from ecommerce.extensions.refund.tests.mixins import RefundTestMixin
-from ecommerce.tests.mixins import LmsApiMockMixin
+from ecommerce.tests.factories import PartnerFactory
+from ecommerce.tests.mixins import LmsApiMockMixin, TestDataUserMixin
 from ecommerce.tests.testcases import TestCase
 
 Order = get_model('order', 'Order')
 
 
-class FreeCheckoutViewTests(TestCase):
+class FreeCheckoutViewTests(TestDataUserMixin, TestCase):
     """ FreeCheckoutView view tests. """
     path = reverse('checkout:free-checkout')
 
+    @classmethod
+    def setUpTestData(cls):
+        super(FreeCheckoutViewTests, cls).setUpTestData()
+        # Both products are created in the same transaction, so share one partner, since Oscar's partner factory
+        # leaves the unique short code blank, and skip the categories, whose factory paths may already be taken.
+        partner = PartnerFactory()
+        cls.products_by_price = {
+            price: factories.ProductFactory(
+                categories=[], stockrecords__partner=partner, stockrecords__price_excl_tax=price
+            )
+            for price in (0, 10)
+        }
+
     def setUp(self):
         super(FreeCheckoutViewTests, self).setUp()
-        self.user = self.create_user()
         self.client.login(username=self.user.username, password=self.password)
         self.toggle_ecommerce_receipt_page(True)
 
     def prepare_basket(self, price):
         """ Helper function that creates a basket and adds a product with set price to it. """
         basket = factories.BasketFactory(owner=self.user, site=self.site)
-        basket.add_product(factories.ProductFactory(stockrecords__price_excl_tax=price), 1)
+        basket.add_product(self.products_by_price[price], 1)
         self.assertEqual(basket.lines.count(), 1)
         self.assertEqual(basket.total_incl_tax, Decimal(price))
 
@@ -23,4 +23,6 @@ class FulfillmentTestMixin(object):
             * The order's lines' statuses are COMPLETE.
         """
         self.assertEqual(order.status, ORDER.COMPLETE)
-        self.assertSetEqual(set(order.lines.values_list('status', flat=True)), set([LINE.COMPLETE]))
+        # Clear the default ordering so DISTINCT applies to the status column alone.
+        line_statuses = order.lines.order_by().values_list('status', flat=True).distinct()
+        self.assertSetEqual(set(line_statuses), set([LINE.COMPLETE]))
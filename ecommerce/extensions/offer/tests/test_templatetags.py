@@ -6,12 +6,17 @@ from ecommerce.tests.testcases import TestCase
 
 Benefit = get_model('offer', 'Benefit')
 
+BENEFIT_DISCOUNT_TEMPLATE = Template(
+    "{% load offer_tags %}"
+    "{{ benefit|benefit_discount }}"
+)
+
 
 class OfferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super(OfferTests, cls).setUpTestData()
+        cls.benefit = BenefitFactory(type=Benefit.PERCENTAGE, value=35.00)
+
     def test_benefit_discount(self):
-        benefit = BenefitFactory(type=Benefit.PERCENTAGE, value=35.00)
-        template = Template(
-            "{% load offer_tags %}"
-            "{{ benefit|benefit_discount }}"
-        )
-        self.assertEqual(template.render(Context({'benefit': benefit})), '35%')
+        self.assertEqual(BENEFIT_DISCOUNT_TEMPLATE.render(Context({'benefit': self.benefit})), '35%')
@@ -50,6 +50,12 @@ def format_benefit_value(benefit):
     """
     Format benefit value for display based on the benefit type
 
+    Also registered as the benefit_discount template filter.
+
+    Example:
+        '100%' if benefit.value == 100.00 and benefit.type == 'Percentage'
+        '$100.00' if benefit.value == 100.00 and benefit.type == 'Absolute'
+
     Arguments:
         benefit (Benefit): Benefit to be displayed
 
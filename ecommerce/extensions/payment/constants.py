@@ -23,7 +23,7 @@ CARD_TYPES = {
     },
 }
 
-CARD_TYPE_CHOICES = ((key, value['display_name']) for key, value in six.iteritems(CARD_TYPES))
+CARD_TYPE_CHOICES = tuple((key, value['display_name']) for key, value in six.iteritems(CARD_TYPES))
 CYBERSOURCE_CARD_TYPE_MAP = {
     value['cybersource_code']: key for key, value in six.iteritems(CARD_TYPES) if 'cybersource_code' in value
 }
@@ -60,15 +60,14 @@ class RefundTestMixin(CourseCatalogTestMixin):
         self.assertEqual(refund.user, order.user)
         self.assertEqual(refund.status, settings.OSCAR_INITIAL_REFUND_STATUS)
         self.assertEqual(refund.total_credit_excl_tax, order.total_excl_tax)
-        self.assertEqual(refund.lines.count(), order.lines.count())
 
-        refund_lines = refund.lines.all()
-        order_lines = order.lines.all().order_by('refund_lines')
-        for refund_line, order_line in zip(refund_lines, order_lines):
-            self.assertEqual(refund_line.status, settings.OSCAR_INITIAL_REFUND_LINE_STATUS)
-            self.assertEqual(refund_line.order_line, order_line)
-            self.assertEqual(refund_line.line_credit_excl_tax, order_line.line_price_excl_tax)
-            self.assertEqual(refund_line.quantity, order_line.quantity)
+        refund_lines = list(refund.lines.values_list('status', 'order_line_id', 'line_credit_excl_tax', 'quantity'))
+        expected = [
+            (settings.OSCAR_INITIAL_REFUND_LINE_STATUS, line_id, line_price_excl_tax, quantity)
+            for line_id, line_price_excl_tax, quantity
+            in order.lines.order_by('refund_lines').values_list('id', 'line_price_excl_tax', 'quantity')
+        ]
+        self.assertEqual(refund_lines, expected)
 
     def create_refund(self, processor_name=DummyProcessor.NAME, **kwargs):
         refund = RefundFactory(**kwargs)
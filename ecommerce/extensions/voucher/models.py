@@ -2,6 +2,7 @@ import datetime
 import logging
 
 from django.db import models
+from django.utils.functional import cached_property
 from oscar.apps.voucher.abstract_models import AbstractVoucher  # pylint: disable=ungrouped-imports
 
 from ecommerce.core.utils import log_message_and_raise_validation_error
@@ -54,6 +55,15 @@ class Voucher(AbstractVoucher):
                 'Failed to create Voucher. Voucher start and end datetime fields must be type datetime.'
             )
 
+    @cached_property
+    def original_offer(self):
+        """ The first offer associated with this voucher.
+
+        The value is cached on the instance so that code validating, and then applying, a voucher does not
+        query for the offer each time it is needed. Offers prefetched by the caller are reused.
+        """
+        return next(iter(self.offers.all()), None)
+
     @classmethod
     def does_exist(cls, code):
         try:
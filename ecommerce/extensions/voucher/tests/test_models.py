@@ -5,6 +5,7 @@ from django.core.exceptions import ValidationError
 from django.utils.timezone import now
 from oscar.core.loading import get_model
 
+from ecommerce.extensions.test.factories import prepare_voucher
 from ecommerce.tests.testcases import TestCase
 
 Voucher = get_model('voucher', 'Voucher')
@@ -58,3 +59,22 @@ class VoucherTests(TestCase):
         self.data['start_datetime'] = self.data['end_datetime'] + datetime.timedelta(days=1)
         with self.assertRaises(ValidationError):
             Voucher.objects.create(**self.data)
+
+    def test_original_offer(self):
+        """ Verify the voucher's first offer is returned, and only queried once. """
+        voucher, __ = prepare_voucher()
+        voucher = Voucher.objects.get(pk=voucher.pk)
+        expected = voucher.offers.first()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(voucher.original_offer, expected)
+            self.assertEqual(voucher.original_offer, expected)
+
+    def test_original_offer_prefetched(self):
+        """ Verify prefetched offers are used, rather than querying for the first offer again. """
+        voucher, __ = prepare_voucher()
+        expected = voucher.offers.first()
+        voucher = Voucher.objects.prefetch_related('offers').get(pk=voucher.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(voucher.original_offer, expected)
@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 
 import ddt
 import httpretty
+import mock
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from django.test import override_settings
@@ -201,6 +202,16 @@ class UtilTests(CouponMixin, CourseCatalogMockMixin, CourseCatalogTestMixin, Lms
         self.assertEqual(voucher.start_datetime, self.data['start_datetime'])
         self.assertEqual(voucher.usage, Voucher.SINGLE_USE)
 
+    @mock.patch('ecommerce.extensions.voucher.utils.VOUCHER_BATCH_SIZE', 3)
+    def test_create_vouchers_in_batches(self):
+        """ Verify vouchers spanning several batches are all created and linked to an offer. """
+        self.data['quantity'] = 7
+        vouchers = create_vouchers(**self.data)
+
+        self.assertEqual(len(vouchers), 7)
+        self.assertEqual(len({voucher.code for voucher in vouchers}), 7)
+        self.assertEqual(Voucher.offers.through.objects.filter(voucher__in=vouchers).count(), 7)
+
     @ddt.data(
         {'end_datetime': ''},
         {'end_datetime': 3},
@@ -233,6 +244,19 @@ class UtilTests(CouponMixin, CourseCatalogMockMixin, CourseCatalogTestMixin, Lms
             voucher = create_vouchers(**self.data)
             self.assertTrue(Voucher.objects.filter(code__iexact=voucher[0].code).exists())
 
+    @override_settings(VOUCHER_CODE_LENGTH=VOUCHER_CODE_LENGTH)
+    @mock.patch('ecommerce.extensions.voucher.utils.VOUCHER_CODE_GENERATION_ATTEMPTS', 5)
+    def test_voucher_code_generation_gives_up(self):
+        """
+        Test that voucher creation fails, rather than retrying forever, when unique codes cannot be generated.
+        """
+        # One-character base32 codes only allow 32 distinct vouchers.
+        self.data['quantity'] = 33
+        voucher_count = Voucher.objects.count()
+        with self.assertRaises(ValidationError):
+            create_vouchers(**self.data)
+        self.assertEqual(Voucher.objects.count(), voucher_count)
+
     @override_settings(VOUCHER_CODE_LENGTH=0)
     def test_nonpositive_voucher_code_length(self):
         """
@@ -356,7 +380,8 @@ class UtilTests(CouponMixin, CourseCatalogMockMixin, CourseCatalogTestMixin, Lms
         self.use_voucher('TESTORDER3', vouchers[2], user2)
 
         self.mock_course_api_response(course=self.course)
-        field_names, rows = generate_coupon_report(self.coupon_vouchers)
+        with self.assertNumQueries(20):
+            field_names, rows = generate_coupon_report(self.coupon_vouchers)
 
         self.assertEqual(field_names, [
             'Code',
@@ -395,6 +420,24 @@ class UtilTests(CouponMixin, CourseCatalogMockMixin, CourseCatalogTestMixin, Lms
         self.assertNotIn('Course Seat Types', field_names)
         self.assertNotIn('Redeemed For Course ID', field_names)
 
+    def test_generate_coupon_report_query_count(self):
+        """ Verify the number of queries made for the coupon report does not grow with the vouchers or redemptions. """
+        self.setup_coupons_for_report()
+        client = UserFactory()
+        basket = Basket.get_basket(client, self.site)
+        basket.add_product(self.coupon)
+        self.mock_course_api_response(course=self.course)
+
+        self.data['quantity'] = 5
+        self.coupon_vouchers.first().vouchers.add(*create_vouchers(**self.data))
+        vouchers = self.coupon_vouchers.first().vouchers.all()
+        for index, voucher in enumerate(vouchers[1:6]):
+            self.use_voucher('TESTORDER{}'.format(index), voucher, UserFactory())
+
+        with self.assertNumQueries(20):
+            __, rows = generate_coupon_report(self.coupon_vouchers)
+        self.assertEqual(len(rows), 14)
+
     def test_report_for_dynamic_coupon_with_fixed_benefit_type(self):
         """ Verify the coupon report contains correct data for coupon with fixed benefit type. """
         dynamic_coupon = self.create_coupon(
@@ -3,7 +3,8 @@ import base64
 import datetime
 import hashlib
 import logging
-import uuid
+import os
+from collections import defaultdict
 from decimal import Decimal, DecimalException
 
 import dateutil.parser
@@ -11,6 +12,7 @@ import pytz
 from django.conf import settings
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 from opaque_keys.edx.keys import CourseKey
 from oscar.core.loading import get_model
@@ -37,25 +39,59 @@ StockRecord = get_model('partner', 'StockRecord')
 Voucher = get_model('voucher', 'Voucher')
 VoucherApplication = get_model('voucher', 'VoucherApplication')
 
-
-def _get_voucher_status(voucher, offer):
+# Maximum number of vouchers inserted, or looked up by code, in a single query.
+VOUCHER_BATCH_SIZE = 500
+
+# Maximum number of batches of generated voucher codes that may contain collisions before giving up.
+VOUCHER_CODE_GENERATION_ATTEMPTS = 1000
+
+COUPON_REPORT_FIELD_NAMES = (
+    _('Code'),
+    _('Coupon Name'),
+    _('Maximum Coupon Usage'),
+    _('Redemption Count'),
+    _('Coupon Type'),
+    _('URL'),
+    _('Course ID'),
+    _('Catalog Query'),
+    _('Course Seat Types'),
+    _('Organization'),
+    _('Client'),
+    _('Category'),
+    _('Note'),
+    _('Price'),
+    _('Invoiced Amount'),
+    _('Discount Percentage'),
+    _('Discount Amount'),
+    _('Status'),
+    _('Order Number'),
+    _('Redeemed By Username'),
+    _('Redeemed For Course ID'),
+    _('Created By'),
+    _('Create Date'),
+    _('Coupon Start Date'),
+    _('Coupon Expiry Date'),
+    _('Email Domains'),
+)
+
+
+def _get_voucher_status(voucher, offer, datetime_now):
     """Retrieve the status of a voucher.
 
     Arguments:
         voucher(Voucher)
         offer(Offer)
+        datetime_now(datetime): Time the status is determined for
 
     Returns
         status(translate string object)
     """
-
-    datetime_now = datetime.datetime.now(pytz.UTC)
     not_expired = (
         voucher.start_datetime < datetime_now and
         voucher.end_datetime > datetime_now
     )
     if not_expired:
-        status = _('Redeemed') if not offer.is_available() else _('Active')
+        status = _('Redeemed') if not offer.is_available(test_date=datetime_now) else _('Active')
     else:
         status = _('Inactive')
 
@@ -83,18 +119,18 @@ def _get_discount_info(discount_data):
 
 
 def _get_info_for_coupon_report(coupon, voucher):
-    history = coupon.history.first()
+    history = coupon.history.select_related('history_user').first()
     author = history.history_user.full_name
-    category_name = ProductCategory.objects.get(product=coupon).category.name
+    category_name = ProductCategory.objects.select_related('category').get(product=coupon).category.name
 
     try:
         note = coupon.attr.note
     except AttributeError:
         note = ''
 
-    offer = voucher.offers.first()
-    coupon_stockrecord = StockRecord.objects.get(product=coupon)
-    invoiced_amount = currency(coupon_stockrecord.price_excl_tax)
+    offer = voucher.original_offer
+    coupon_price = StockRecord.objects.values_list('price_excl_tax', flat=True).get(product=coupon)
+    invoiced_amount = currency(coupon_price)
     if offer.condition.range.catalog:
         seat_stockrecord = offer.condition.range.catalog.stock_records.first()
         course_id = seat_stockrecord.product.attr.course_key
@@ -144,9 +180,9 @@ def _get_info_for_coupon_report(coupon, voucher):
     return coupon_data
 
 
-def _get_voucher_info_for_coupon_report(voucher):
-    offer = voucher.offers.first()
-    status = _get_voucher_status(voucher, offer)
+def _get_voucher_info_for_coupon_report(voucher, datetime_now):
+    offer = voucher.original_offer
+    status = _get_voucher_status(voucher, offer, datetime_now)
     path = '{path}?code={code}'.format(path=reverse('coupons:offer'), code=voucher.code)
     url = get_ecommerce_url(path)
 
@@ -187,106 +223,77 @@ def generate_coupon_report(coupon_vouchers):
         List[dict]
     """
 
-    field_names = [
-        _('Code'),
-        _('Coupon Name'),
-        _('Maximum Coupon Usage'),
-        _('Redemption Count'),
-        _('Coupon Type'),
-        _('URL'),
-        _('Course ID'),
-        _('Catalog Query'),
-        _('Course Seat Types'),
-        _('Organization'),
-        _('Client'),
-        _('Category'),
-        _('Note'),
-        _('Price'),
-        _('Invoiced Amount'),
-        _('Discount Percentage'),
-        _('Discount Amount'),
-        _('Status'),
-        _('Order Number'),
-        _('Redeemed By Username'),
-        _('Redeemed For Course ID'),
-        _('Created By'),
-        _('Create Date'),
-        _('Coupon Start Date'),
-        _('Coupon Expiry Date'),
-        _('Email Domains'),
-    ]
     rows = []
+    # Use the same point in time to determine the status of every voucher in the report.
+    datetime_now = datetime.datetime.now(pytz.UTC)
 
     for coupon_voucher in coupon_vouchers:
         coupon = coupon_voucher.coupon
-        client = Invoice.objects.get(order__lines__product=coupon).business_client.name
-        rows.append(_get_info_for_coupon_report(coupon, coupon_voucher.vouchers.first()))
+        client = Invoice.objects.filter(order__lines__product=coupon).values_list(
+            'business_client__name', flat=True
+        ).get()
+        vouchers = list(coupon_voucher.vouchers.order_by('id').prefetch_related('offers'))
+        rows.append(_get_info_for_coupon_report(coupon, vouchers[0]))
         rows[0]['Client'] = client
 
-        for voucher in coupon_voucher.vouchers.all().prefetch_related('offers'):
-            row = _get_voucher_info_for_coupon_report(voucher)
+        applications_by_voucher = defaultdict(list)
+        # Filter with a subquery, rather than a list of IDs, so the number of bound parameters stays fixed.
+        voucher_applications = VoucherApplication.objects.filter(
+            voucher__in=coupon_voucher.vouchers.filter(num_orders__gt=0)
+        ).select_related('user', 'order').prefetch_related('order__lines__product')
+        for application in voucher_applications:
+            applications_by_voucher[application.voucher_id].append(application)
+
+        for voucher in vouchers:
+            row = _get_voucher_info_for_coupon_report(voucher, datetime_now)
 
             for item in ('Order Number', 'Redeemed By Username',):
                 row[item] = ''
 
             rows.append(row)
-            if voucher.num_orders > 0:
-                voucher_applications = VoucherApplication.objects.filter(
-                    voucher=voucher).prefetch_related('user', 'order__lines')
-                for application in voucher_applications:
-                    redemption_user_username = application.user.username
-                    redemption_course_id = application.order.lines.first().product.course_id
+            for application in applications_by_voucher[voucher.id]:
+                redemption_user_username = application.user.username
+                # Index the prefetched lines; first() would issue a new query per application.
+                redemption_course_id = application.order.lines.all()[0].product.course_id
 
-                    new_row = row.copy()
+                new_row = row.copy()
 
-                    if 'Catalog Query' in rows[0]:
-                        new_row['Redeemed For Course ID'] = redemption_course_id
+                if 'Catalog Query' in rows[0]:
+                    new_row['Redeemed For Course ID'] = redemption_course_id
 
-                    new_row.update({
-                        'Status': _('Redeemed'),
-                        'Order Number': application.order.number,
-                        'Redeemed By Username': redemption_user_username,
-                        'Maximum Coupon Usage': 1,
-                        'Redemption Count': 1,
-                    })
+                new_row.update({
+                    'Status': _('Redeemed'),
+                    'Order Number': application.order.number,
+                    'Redeemed By Username': redemption_user_username,
+                    'Maximum Coupon Usage': 1,
+                    'Redemption Count': 1,
+                })
 
-                    rows.append(new_row)
+                rows.append(new_row)
 
     if 'Catalog Query' in rows[0]:
-        field_names.remove('Course ID')
-        field_names.remove('Organization')
+        excluded_field_names = ('Course ID', 'Organization')
     else:
-        field_names.remove('Catalog Query')
-        field_names.remove('Course Seat Types')
-        field_names.remove('Redeemed For Course ID')
+        excluded_field_names = ('Catalog Query', 'Course Seat Types', 'Redeemed For Course ID')
+    field_names = [
+        field_name for field_name in COUPON_REPORT_FIELD_NAMES if field_name not in excluded_field_names
+    ]
 
     return field_names, rows
 
 
-def _get_or_create_offer(
-        product_range, benefit_type, benefit_value, coupon_id=None,
-        max_uses=None, offer_number=None, email_domains=None
-):
+def _get_or_create_condition_and_benefit(product_range, benefit_type, benefit_value):
     """
-    Return an offer for a catalog with condition and benefit.
-
-    If offer doesn't exist, new offer will be created and associated with
-    provided Offer condition and benefit.
+    Return the offer condition and benefit for a range of products.
 
     Args:
-        product_range (Range): Range of products associated with condition
-        benefit_type (str): Type of benefit associated with the offer
-        benefit_value (Decimal): Value of benefit associated with the offer
-    Kwargs:
-        coupon_id (int): ID of the coupon
-        max_uses (int): number of maximum global application number an offer can have
-        offer_number (int): number of the consecutive offer - used in case of a multiple
-                            multi-use coupon
-        email_domains (str): a comma-separated string of email domains allowed to apply
-                            this offer
+        product_range (Range): Range of products associated with condition and benefit
+        benefit_type (str): Type of benefit
+        benefit_value (Decimal): Value of benefit
 
     Returns:
-        Offer
+        Condition
+        Benefit
     """
     offer_condition, __ = Condition.objects.get_or_create(
         range=product_range,
@@ -305,6 +312,33 @@ def _get_or_create_offer(
             'Failed to create Benefit. Benefit value must be a positive number or 0.'
         )
 
+    return offer_condition, offer_benefit
+
+
+def _get_or_create_offer(
+        offer_condition, offer_benefit, coupon_id=None,
+        max_uses=None, offer_number=None, email_domains=None
+):
+    """
+    Return an offer with condition and benefit.
+
+    If offer doesn't exist, new offer will be created and associated with
+    provided Offer condition and benefit.
+
+    Args:
+        offer_condition (Condition): Condition associated with the offer
+        offer_benefit (Benefit): Benefit associated with the offer
+    Kwargs:
+        coupon_id (int): ID of the coupon
+        max_uses (int): number of maximum global application number an offer can have
+        offer_number (int): number of the consecutive offer - used in case of a multiple
+                            multi-use coupon
+        email_domains (str): a comma-separated string of email domains allowed to apply
+                            this offer
+
+    Returns:
+        Offer
+    """
     offer_name = "Coupon [{}]-{}-{}".format(coupon_id, offer_benefit.type, offer_benefit.value)
     if offer_number:
         offer_name = "{} [{}]".format(offer_name, offer_number)
@@ -321,51 +355,73 @@ def _get_or_create_offer(
     return offer
 
 
-def _generate_code_string(length):
+def _generate_code_strings(length, quantity):
     """
-    Create a string of random characters of specified length
+    Create unique strings of random characters of specified length.
+
+    Candidates are generated in batches, and each batch is checked against saved vouchers with a single query.
+    Candidates that collide with saved vouchers, or with each other, are replaced in the next batch.
 
     Args:
-        length (int): Defines the length of randomly generated string.
+        length (int): Defines the length of randomly generated strings.
+        quantity (int): Number of strings to generate.
 
     Raises:
         ValueError raised if length is less than one.
+        ValidationError raised if unique strings could not be generated within
+            VOUCHER_CODE_GENERATION_ATTEMPTS batches containing collisions.
 
     Returns:
-        str
+        List[str]
     """
     if length < 1:
         raise ValueError("Voucher code length must be a positive number.")
 
-    h = hashlib.sha256()
-    h.update(uuid.uuid4().get_bytes())
-    voucher_code = base64.b32encode(h.digest())[0:length]
-    if Voucher.objects.filter(code__iexact=voucher_code).exists():
-        return _generate_code_string(length)
+    # Each base32 character encodes five random bits.
+    num_bytes = (length * 5 + 7) // 8
+    codes = set()
+    attempts = 0
+    while len(codes) < quantity:
+        batch_size = min(quantity - len(codes), VOUCHER_BATCH_SIZE)
+        candidates = {base64.b32encode(os.urandom(num_bytes))[0:length] for __ in range(batch_size)} - codes
+        # Base32 output is upper case, as are saved voucher codes, so an exact match can use the unique index.
+        candidates.difference_update(Voucher.objects.filter(code__in=candidates).values_list('code', flat=True))
+        codes.update(candidates)
+
+        if len(candidates) < batch_size:
+            attempts += 1
+            if attempts >= VOUCHER_CODE_GENERATION_ATTEMPTS:
+                log_message_and_raise_validation_error(
+                    'Failed to create Voucher. Unable to generate [{quantity}] unique voucher codes.'.format(
+                        quantity=quantity
+                    )
+                )
 
-    return voucher_code
+    return list(codes)
 
 
-def _create_new_voucher(code, end_datetime, name, offer, start_datetime, voucher_type):
+def _create_new_vouchers(code, end_datetime, name, offers, quantity, start_datetime, voucher_type):
     """
-    Creates a voucher.
+    Creates vouchers in bulk.
 
-    If randomly generated voucher code already exists, new code will be generated and reverified.
+    If no code is provided, a unique code is generated for each voucher.
 
     Args:
-        code (str): Code associated with vouchers. If not provided, one will be generated.
+        code (str): Code associated with vouchers. If not provided, codes will be generated.
         end_datetime (datetime): Voucher end date.
         name (str): Voucher name.
-        offer (Offer): Offer associated with voucher.
+        offers (List[Offer]): Offers associated with vouchers. A single offer is shared by all vouchers,
+                              otherwise each voucher is associated with the offer at the same position.
+        quantity (int): Number of vouchers to be created.
         start_datetime (datetime): Voucher start date.
         voucher_type (str): Voucher usage.
 
     Returns:
-        Voucher
+        List[Voucher]
     """
+    offer = offers[0]
     if offer.benefit.type == Benefit.PERCENTAGE and offer.benefit.value == 100 and code:
         log_message_and_raise_validation_error('Failed to create Voucher. Code may not be set for enrollment coupon.')
-    voucher_code = code or _generate_code_string(settings.VOUCHER_CODE_LENGTH)
 
     if not end_datetime:
         log_message_and_raise_validation_error('Failed to create Voucher. Voucher end datetime field must be set.')
@@ -387,16 +443,48 @@ def _create_new_voucher(code, end_datetime, name, offer, start_datetime, voucher
                 'Failed to create Voucher. Voucher start datetime [{date}] is invalid.'.format(date=start_datetime)
             )
 
-    voucher = Voucher.objects.create(
-        name=name,
-        code=voucher_code,
-        usage=voucher_type,
-        start_datetime=start_datetime,
-        end_datetime=end_datetime
+    if code:
+        codes = [code] * quantity
+    else:
+        codes = _generate_code_strings(settings.VOUCHER_CODE_LENGTH, quantity)
+
+    vouchers = []
+    for voucher_code in codes:
+        # bulk_create() bypasses Voucher.save(), so validate and normalize the code here instead.
+        voucher = Voucher(
+            name=name,
+            code=voucher_code.upper(),
+            usage=voucher_type,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime
+        )
+        voucher.clean()
+        vouchers.append(voucher)
+
+    Voucher.objects.bulk_create(vouchers, batch_size=VOUCHER_BATCH_SIZE)
+    # Primary keys are not set by bulk_create() on MySQL, so look them up by the vouchers' unique codes.
+    # Look them up in batches to keep each query within the database's limit on bound parameters.
+    for start in range(0, len(vouchers), VOUCHER_BATCH_SIZE):
+        batch = vouchers[start:start + VOUCHER_BATCH_SIZE]
+        batch_codes = [voucher.code for voucher in batch]
+        ids_by_code = dict(Voucher.objects.filter(code__in=batch_codes).values_list('code', 'id'))
+        for voucher in batch:
+            voucher.id = ids_by_code[voucher.code]
+            # Mark the instances as saved, as bulk_create() does itself for instances whose keys it knows,
+            # so they can be used in relations like any other saved voucher.
+            voucher._state.adding = False  # pylint: disable=protected-access
+            voucher._state.db = Voucher.objects.db  # pylint: disable=protected-access
+
+    voucher_offers = offers if len(offers) > 1 else [offer] * len(vouchers)
+    Voucher.offers.through.objects.bulk_create(
+        [
+            Voucher.offers.through(voucher=voucher, conditionaloffer=voucher_offer)
+            for voucher, voucher_offer in zip(vouchers, voucher_offers)
+        ],
+        batch_size=VOUCHER_BATCH_SIZE
     )
-    voucher.offers.add(offer)
 
-    return voucher
+    return vouchers
 
 
 def create_vouchers(
@@ -445,7 +533,6 @@ def create_vouchers(
         List[Voucher]
     """
     logger.info("Creating [%d] vouchers product [%s]", quantity, coupon.id)
-    vouchers = []
     offers = []
 
     # Maximum number of uses can be set for each voucher type and disturb
@@ -488,34 +575,36 @@ def create_vouchers(
     # offer because the usage is tied to the offer so that a usage on one voucher would
     # mean all vouchers will have their usage decreased by one, hence each voucher needs
     # its own offer to keep track of its own usages without interfering with others.
-    multi_offer = True if (
-        voucher_type == Voucher.MULTI_USE or voucher_type == Voucher.ONCE_PER_CUSTOMER
-    ) else False
+    multi_offer = voucher_type in (Voucher.MULTI_USE, Voucher.ONCE_PER_CUSTOMER)
     num_of_offers = quantity if multi_offer else 1
-    for num in range(num_of_offers):
-        offer = _get_or_create_offer(
+    # Create the offers and vouchers in a single transaction, so a failure leaves no partial batch behind.
+    with transaction.atomic():
+        # Every offer shares the same condition and benefit, so only look them up once.
+        offer_condition, offer_benefit = _get_or_create_condition_and_benefit(
             product_range=product_range,
             benefit_type=benefit_type,
-            benefit_value=benefit_value,
-            max_uses=max_uses,
-            coupon_id=coupon.id,
-            offer_number=num,
-            email_domains=email_domains
+            benefit_value=benefit_value
         )
-        offers.append(offer)
+        for num in range(num_of_offers):
+            offer = _get_or_create_offer(
+                offer_condition=offer_condition,
+                offer_benefit=offer_benefit,
+                max_uses=max_uses,
+                coupon_id=coupon.id,
+                offer_number=num,
+                email_domains=email_domains
+            )
+            offers.append(offer)
 
-    for i in range(quantity):
-        voucher = _create_new_voucher(
+        return _create_new_vouchers(
+            code=code,
             end_datetime=end_datetime,
-            offer=offers[i] if multi_offer else offers[0],
+            name=name,
+            offers=offers,
+            quantity=quantity,
             start_datetime=start_datetime,
-            voucher_type=voucher_type,
-            code=code,
-            name=name
+            voucher_type=voucher_type
         )
-        vouchers.append(voucher)
-
-    return vouchers
 
 
 def get_voucher_discount_info(benefit, price):
@@ -530,35 +619,31 @@ def get_voucher_discount_info(benefit, price):
         dict
     """
 
-    if benefit and price > 0:
-        benefit_value = float(benefit.value)
-        price = float(price)
-        if benefit.type == Benefit.PERCENTAGE:
-            return {
-                'discount_percentage': benefit_value,
-                'discount_value': get_discount_value(discount_percentage=benefit_value, product_price=price),
-                'is_discounted': True if benefit.value < 100 else False
-            }
-        else:
-            discount_percentage = get_discount_percentage(discount_value=benefit_value, product_price=price)
-            if discount_percentage > 100:
-                discount_percentage = 100.00
-                discount_value = price
-            else:
-                discount_percentage = discount_percentage
-                discount_value = benefit_value
-            return {
-                'discount_percentage': discount_percentage,
-                'discount_value': float(discount_value),
-                'is_discounted': True if discount_percentage < 100 else False,
-            }
-    else:
+    if not benefit or price <= 0:
         return {
             'discount_percentage': 0.00,
             'discount_value': 0.00,
             'is_discounted': False
         }
 
+    benefit_value = float(benefit.value)
+    price = float(price)
+    if benefit.type == Benefit.PERCENTAGE:
+        return {
+            'discount_percentage': benefit_value,
+            'discount_value': get_discount_value(discount_percentage=benefit_value, product_price=price),
+            'is_discounted': benefit_value < 100
+        }
+
+    # A fixed discount cannot exceed the price of the product.
+    discount_value = min(benefit_value, price)
+    discount_percentage = get_discount_percentage(discount_value=discount_value, product_price=price)
+    return {
+        'discount_percentage': discount_percentage,
+        'discount_value': discount_value,
+        'is_discounted': discount_percentage < 100,
+    }
+
 
 def update_voucher_offer(offer, benefit_value, benefit_type, coupon, max_uses=None, email_domains=None):
     """
@@ -578,10 +663,14 @@ def update_voucher_offer(offer, benefit_value, benefit_type, coupon, max_uses=No
     Returns:
         Offer
     """
-    return _get_or_create_offer(
+    offer_condition, offer_benefit = _get_or_create_condition_and_benefit(
         product_range=offer.benefit.range,
         benefit_value=benefit_value,
-        benefit_type=benefit_type,
+        benefit_type=benefit_type
+    )
+    return _get_or_create_offer(
+        offer_condition=offer_condition,
+        offer_benefit=offer_benefit,
         coupon_id=coupon.id,
         max_uses=max_uses,
         email_domains=email_domains
@@ -603,12 +692,14 @@ def get_cached_voucher(code):
         Voucher.DoesNotExist: When no vouchers with provided code exist.
     """
     cache_key = 'voucher_{code}'.format(code=code)
+    # Codes come from the request, so hash them into a key that is always valid for memcached.
     cache_key = hashlib.md5(cache_key).hexdigest()
-    voucher = cache.get(cache_key)
-    if not voucher:
-        voucher = Voucher.objects.get(code=code)
-        cache.set(cache_key, voucher, settings.VOUCHER_CACHE_TIMEOUT)
-    return voucher
+    # The offer's benefit range is cached along with the voucher, since callers use it right away.
+    return cache.get_or_set(
+        cache_key,
+        lambda: Voucher.objects.prefetch_related('offers__benefit__range').get(code=code),
+        settings.VOUCHER_CACHE_TIMEOUT
+    )
 
 
 def get_voucher_and_products_from_code(code):
@@ -627,7 +718,7 @@ def get_voucher_and_products_from_code(code):
         ProductNotFoundError: When no products are associated with the voucher.
     """
     voucher = get_cached_voucher(code)
-    voucher_range = voucher.offers.first().benefit.range
+    voucher_range = voucher.original_offer.benefit.range
     products = voucher_range.all_products()
 
     if products or voucher_range.catalog_query or voucher_range.course_catalog:
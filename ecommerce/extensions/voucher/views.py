@@ -27,7 +27,7 @@ class CouponReportCSVView(StaffOnlyMixin, View):
         """
         coupon = Product.objects.get(id=coupon_id)
         filename = _("Coupon Report for {coupon_name}").format(coupon_name=unicode(coupon))
-        coupons_vouchers = CouponVouchers.objects.filter(coupon=coupon)
+        coupons_vouchers = CouponVouchers.objects.filter(coupon=coupon).select_related('coupon')
 
         filename = "{}.csv".format(slugify(filename))
 
@@ -245,6 +245,8 @@ CREDIT_PROVIDER_CACHE_TIMEOUT = 600
 
 VOUCHER_CACHE_TIMEOUT = 10  # Value is in seconds.
 
+ACCOUNT_ACTIVATION_STATUS_CACHE_TIMEOUT = 300  # Value is in seconds.
+
 SDN_CHECK_REQUEST_TIMEOUT = 5  # Value is in seconds.
 
 # APP CONFIGURATION
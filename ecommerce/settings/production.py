@@ -26,6 +26,17 @@ COMPRESS_CSS_FILTERS += [
 
 LOGGING['handlers']['local']['level'] = 'INFO'
 
+# TEMPLATE CONFIGURATION
+# Cache compiled templates. Templates found by the theme loader depend on the theme of the current site, so
+# the cache keeps a separate entry for each theme.
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('ecommerce.theming.template_loaders.ThemeCachedTemplateLoader', [
+        'ecommerce.theming.template_loaders.ThemeTemplateLoader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+# END TEMPLATE CONFIGURATION
+
 
 def get_env_setting(setting):
     """ Get the environment setting or return exception """
@@ -70,6 +70,19 @@ class UserMixin(object):
         return "JWT {token}".format(token=jwt.encode(payload, secret))
 
 
+class TestDataUserMixin(object):
+    """
+    Creates a single user, shared by all tests in the class, in setUpTestData().
+
+    Must be combined with UserMixin, which provides the password.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super(TestDataUserMixin, cls).setUpTestData()
+        cls.user = factories.UserFactory(password=cls.password)
+
+
 class ThrottlingMixin(object):
     """Provides utility methods for test cases validating the behavior of rate-limited endpoints."""
 
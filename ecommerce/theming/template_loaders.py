@@ -1,6 +1,7 @@
 """
 Theming aware template loaders.
 """
+from django.template.loaders.cached import Loader as CachedLoader
 from django.template.loaders.filesystem import Loader
 from threadlocals.threadlocals import get_current_request
 
@@ -28,3 +29,23 @@ class ThemeTemplateLoader(Loader):
             theme_dirs = get_all_theme_template_dirs()
 
         return theme_dirs + dirs
+
+
+class ThemeCachedTemplateLoader(CachedLoader):
+    """
+    Cached template loader that keeps separate entries for each theme.
+
+    ThemeTemplateLoader returns different templates depending on the theme of the current site, so the theme is
+    made part of the cache key.
+    """
+    def cache_key(self, template_name, template_dirs, skip=None):
+        key = super(ThemeCachedTemplateLoader, self).cache_key(template_name, template_dirs, skip)
+
+        if get_current_request():
+            theme = get_current_theme()
+            theme_prefix = 'theme:{}'.format(theme.theme_dir_name) if theme else 'theme:'
+        else:
+            # Outside of a request ThemeTemplateLoader searches the directories of every theme.
+            theme_prefix = 'all-themes'
+
+        return '{}-{}'.format(theme_prefix, key)
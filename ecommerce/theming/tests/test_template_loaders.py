@@ -0,0 +1,52 @@
+"""
+Tests for theming template loaders.
+"""
+from django.template import engines
+from mock import patch
+
+from ecommerce.tests.testcases import TestCase
+from ecommerce.theming.template_loaders import ThemeCachedTemplateLoader
+from ecommerce.theming.test_utils import with_comprehensive_theme
+
+
+class TestThemeCachedTemplateLoader(TestCase):
+    """
+    Test the theme aware cached template loader.
+    """
+
+    def setUp(self):
+        super(TestThemeCachedTemplateLoader, self).setUp()
+        self.loader = ThemeCachedTemplateLoader(engines['django'].engine, [
+            'ecommerce.theming.template_loaders.ThemeTemplateLoader',
+        ])
+
+    def get_cache_key(self):
+        return self.loader.cache_key('base.html', None)
+
+    @patch('ecommerce.theming.template_loaders.get_current_request', return_value=object())
+    def test_cache_key_per_theme(self, _mock_request):
+        """
+        Tests the cache key differs between the themes of sites.
+        """
+        keys = set()
+
+        @with_comprehensive_theme('test-theme')
+        def _get_first_theme_key():
+            keys.add(self.get_cache_key())
+
+        @with_comprehensive_theme('test-theme-2')
+        def _get_second_theme_key():
+            keys.add(self.get_cache_key())
+
+        _get_first_theme_key()
+        _get_second_theme_key()
+        keys.add(self.get_cache_key())
+
+        self.assertEqual(len(keys), 3)
+
+    @patch('ecommerce.theming.template_loaders.get_current_request', return_value=None)
+    def test_cache_key_outside_request(self, _mock_request):
+        """
+        Tests templates loaded outside of a request are cached under a separate key.
+        """
+        self.assertEqual(self.get_cache_key(), 'all-themes-base.html')